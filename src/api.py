@@ -0,0 +1,185 @@
+import os
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from jdk import JDKManager
+from maven import MavenManager
+import config
+
+KINDS = ("java", "mvn")
+
+
+class JdkmgrError(Exception):
+    """A request could not be carried out, the message says why"""
+
+
+@dataclass
+class Toolchain:
+    """An installed or available JDK or Maven
+
+    Attributes:
+        kind (str): `java` or `mvn`.
+        name (str): The dir name, e.g. `jdk_17.0.1_ms` or `maven_3.8.4`.
+        version (str): The version.
+        distribution (str): The JDK distribution; `Maven` or `mvnd` for Maven.
+        hash (str): The catalog hash of the archive.
+        installed (bool): True if it is installed.
+        used (bool): True if the `jdk`, `maven` or `mvnd` link points to it.
+        path (str): The absolute path of the installed tree; None if it is not installed.
+    """
+    kind: str
+    name: str
+    version: str
+    distribution: str
+    hash: str
+    installed: bool
+    used: bool
+    path: Optional[str]
+
+
+class Jdkmgr:
+    """In-process API of jdkmgr
+
+    Works on an explicit root dir instead of the current dir, never prints and
+    returns Toolchain objects instead of printing them. The managers are kept
+    in memory between calls; call `reload` to see changes made by other
+    processes. Failures raise JdkmgrError.
+
+    Typical usage:
+        >>> sys.path.insert(0, "/opt/jdkmgr/src")
+        >>> from api import Jdkmgr
+        >>> mgr = Jdkmgr("/opt/jdkmgr")
+        >>> toolchain = mgr.install("java", "jdk_17.0.1_ms", progress=lambda done, total: None)
+        >>> mgr.use("java", toolchain.name)
+        >>> [i.name for i in mgr.list("java") if i.installed]
+    """
+
+    def __init__(self, root: str, peers: list = None) -> None:
+        """Load the catalogs, the installed toolchains and config.json of a jdkmgr root
+
+        Args:
+            root (str): The dir with `source`, `install`, `cache` and `config.json`.
+            peers (list, optional): Base urls of peer cache servers; the peers of config.json by default.
+
+        Raises:
+            FileNotFoundError: If a catalog in `source` is missing.
+        """
+        self.root = os.path.abspath(root)
+        self.last_message = None
+        settings = self.load_config()
+        peers = peers if peers is not None else settings.get("peers")
+        self.managers = {
+            "java": JDKManager(None, settings.get("jdk"), peers, root=self.root, log=self.log),
+            "mvn": MavenManager(None, settings.get("maven"), peers, settings.get("mvnd"), profiles=settings.get("maven_profiles"),
+                                profile=settings.get("maven_profile"), root=self.root, log=self.log),
+        }
+
+    def log(self, *args, **kargs) -> None:
+        """Keep the last message of the managers for the error of a failed call"""
+        if args:
+            self.last_message = " ".join(str(i) for i in args)
+
+    def load_config(self) -> dict:
+        """Read config.json of the root"""
+        return config.load_config(self.root)
+
+    def save_config(self) -> None:
+        """Write the current links and profile to config.json like the CLI does"""
+        config.save_config(self.managers["java"], self.managers["mvn"], self.root)
+
+    def reload(self) -> None:
+        """Load the catalogs, the installed toolchains, the links and the profile again"""
+        config.load_links(self.managers["java"], self.managers["mvn"], self.root)
+        for manager in self.managers.values():
+            manager.load_sources()
+            manager.scan_installed()
+
+    def get_manager(self, kind: str):
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {KINDS}, not {kind}")
+        return self.managers[kind]
+
+    def make_toolchain(self, kind: str, name: str, source: dict, installed: bool) -> Toolchain:
+        if kind == "java":
+            manager = self.managers["java"]
+            return Toolchain(kind, name, source["version"], source["distribution"], source["hash"], installed,
+                             installed and manager.jdk_path == os.path.join("install", name),
+                             manager.get_path("install", name) if installed else None)
+        manager = self.managers["mvn"]
+        return Toolchain(kind, name, source["version"], "mvnd" if source.get("type") == "mvnd" else "Maven", manager.get_hash(source),
+                         installed, installed and name in (manager.maven_path, manager.mvnd_path),
+                         manager.get_path("install", name) if installed else None)
+
+    def list(self, kind: str) -> List[Toolchain]:
+        """List the installed toolchains of a kind, then the ones which can be installed on this platform
+
+        Args:
+            kind (str): `java` or `mvn`.
+
+        Returns:
+            list: Toolchain objects.
+        """
+        manager = self.get_manager(kind)
+        toolchains = [self.make_toolchain(kind, i, manager.indstalled[i], True) for i in manager.indstalled]
+        for i in manager.get_available():
+            toolchains.append(self.resolve(kind, i["name"]))
+        return toolchains
+
+    def resolve(self, kind: str, name: str) -> Optional[Toolchain]:
+        """Resolve a name or hash the way the CLI does
+
+        Args:
+            kind (str): `java` or `mvn`.
+            name (str): The dir name or hash prefix of an installed toolchain, or the name of an available one.
+
+        Returns:
+            Toolchain: None if nothing matches.
+        """
+        result = self.get_manager(kind).resolve(name)
+        if result is None:
+            return None
+        return self.make_toolchain(kind, result["name"], result["source"], result["installed"])
+
+    def install(self, kind: str, name: str, progress: Callable[[int, int], None] = None) -> Toolchain:
+        """Install a toolchain unless it is installed already
+
+        Args:
+            kind (str): `java` or `mvn`.
+            name (str): The name of the toolchain.
+            progress (callable, optional): Called with (downloaded, total) bytes while downloading.
+
+        Returns:
+            Toolchain: The installed toolchain.
+
+        Raises:
+            JdkmgrError: If there is no such toolchain or it could not be installed.
+        """
+        toolchain = self.resolve(kind, name)
+        if toolchain is None:
+            raise JdkmgrError(f"No such toolchain {name}")
+        if toolchain.installed:
+            return toolchain
+        # a callback also keeps the progress bar of the CLI off
+        if not self.get_manager(kind).install(toolchain.name, progress=progress or (lambda downloaded, total: None)):
+            raise JdkmgrError(self.last_message)
+        return self.resolve(kind, toolchain.name)
+
+    def use(self, kind: str, name: str) -> Toolchain:
+        """Point the `jdk`, `maven` or `mvnd` link to an installed toolchain and save config.json
+
+        Args:
+            kind (str): `java` or `mvn`.
+            name (str): The dir name or hash prefix of the toolchain.
+
+        Returns:
+            Toolchain: The used toolchain.
+
+        Raises:
+            JdkmgrError: If the toolchain is not installed.
+        """
+        toolchain = self.resolve(kind, name)
+        if toolchain is None or not toolchain.installed:
+            raise JdkmgrError(f"{name} is not installed")
+        if not self.get_manager(kind).use(toolchain.name):
+            raise JdkmgrError(self.last_message)
+        self.save_config()
+        return self.resolve(kind, toolchain.name)
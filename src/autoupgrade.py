@@ -0,0 +1,57 @@
+import time
+import argparse
+from config import load_links, save_config
+
+
+def run(jdk_manager, maven_manager, remove_old: bool = False, every: float = None, **kargs) -> bool:
+    """Upgrade all installed JDKs and Maven to their newest patch, once or on a schedule
+
+    See `JDKManager.auto_upgrade`: the used toolchains stay available the whole
+    time, their links are switched in one rename after the hash of the new
+    archive is checked. The old versions are kept for a rollback unless remove_old.
+
+    Example:
+    >>> run(jdk_manager, maven_manager, remove_old=True, every=24)
+
+    Args:
+        jdk_manager (JDKManager): The JDK manager.
+        maven_manager (MavenManager): The Maven manager.
+        remove_old (bool, optional): Remove the old versions after the switch.
+        every (float, optional): Repeat every so many hours until interrupted.
+
+    Returns:
+        bool: True if all upgrades of the last run succeeded.
+    """
+    while True:
+        # another jdkmgr may have switched the links since the last run
+        load_links(jdk_manager, maven_manager)
+        try:
+            ok = jdk_manager.auto_upgrade(remove_old)
+            ok = maven_manager.auto_upgrade(remove_old) and ok
+        except Exception as e:
+            if every is None:
+                raise
+            # a scheduled upgrade tries again next time, e.g. while the vendor is down
+            print(f"Upgrade failed: {e}")
+            ok = False
+        save_config(jdk_manager, maven_manager)
+        if every is None:
+            return ok
+        try:
+            time.sleep(every * 3600)
+        except KeyboardInterrupt:
+            return ok
+
+
+def add_parser(parsers: argparse.ArgumentParser, jdk_manager, maven_manager) -> None:
+    """Add the `upgrade` command
+
+    Args:
+        parsers (argparse.ArgumentParser): The top level subparsers.
+        jdk_manager (JDKManager): The JDK manager.
+        maven_manager (MavenManager): The Maven manager.
+    """
+    parser_upgrade = parsers.add_parser("upgrade", help="Upgrade all installed JDKs and Maven to their newest patch")
+    parser_upgrade.add_argument("--remove-old", action="store_true", help="Remove the old versions after the switch instead of keeping them for a rollback")
+    parser_upgrade.add_argument("--every", type=float, metavar="HOURS", help="Repeat every so many hours until interrupted")
+    parser_upgrade.set_defaults(func=lambda remove_old, every, **kargs: run(jdk_manager, maven_manager, remove_old, every))
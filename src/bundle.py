@@ -0,0 +1,200 @@
+import io
+import os
+import sys
+import json
+import gzip
+import shutil
+import tarfile
+import argparse
+from locking import FileLock
+
+INDEX_NAME = "index.json"
+
+
+class BundleManager:
+    """Bundle Manager
+
+    Packs installed JDKs and Maven into one archive and installs them from it on
+    another machine without any network access.
+
+    A bundle is a gzip compressed tar stream. Its first member is `index.json`,
+    which lists the toolchains by name together with their catalog hash and
+    release info. The trees follow as `install/<name>/...`, each of them
+    self-contained: hardlinks only point into their own tree.
+    Both commands accept `-` to stream the bundle over stdout or stdin, e.g.
+
+        jdkmgr bundle export jdk_17.0.1_ms -o - | ssh host jdkmgr bundle import -i -
+
+    Attentions:
+        - Messages are printed to stderr so that they never mix with a bundle on stdout.
+        - Toolchains which are already installed with the same hash are skipped on import.
+        - A toolchain installed under the same name with another hash is not replaced, remove it first.
+    """
+
+    def __init__(self, parsers: argparse.ArgumentParser, jdk_manager, maven_manager, working_dir: str = ".") -> None:
+        """Initialize Bundle Manager
+
+        Args:
+            parsers (argparse.ArgumentParser): The argument parser.
+            jdk_manager (JDKManager): The JDK manager.
+            maven_manager (MavenManager): The Maven manager.
+            working_dir (str, optional): dir the bundle paths are relative to, the dir jdkmgr was started from
+        """
+        self.jdk_manager = jdk_manager
+        self.maven_manager = maven_manager
+        self.working_dir = working_dir
+
+        parser_export = parsers.add_parser('export', help="Pack installed JDKs and Maven into a bundle")
+        parser_export.add_argument('names', nargs='+', help="Names of the installed JDKs and Maven")
+        parser_export.add_argument('-o', '--output', required=True, help="Bundle file, - for stdout")
+        parser_export.set_defaults(func=self.export)
+
+        parser_import = parsers.add_parser('import', help="Install JDKs and Maven from a bundle")
+        parser_import.add_argument('-i', '--input', required=True, help="Bundle file, - for stdin")
+        parser_import.set_defaults(func=self.import_)
+
+    def get_entry(self, name: str) -> dict:
+        """Get the index entry of an installed toolchain
+
+        Args:
+            name (str): The name of the installed JDK or Maven.
+
+        Returns:
+            dict: The keys `name`, `kind`, `hash` and `release`; None if it is not installed.
+        """
+        if name in self.jdk_manager.indstalled:
+            release = self.jdk_manager.indstalled[name]
+            return {"name": name, "kind": "jdk", "hash": release["hash"], "release": release}
+        if name in self.maven_manager.indstalled:
+            release = self.maven_manager.indstalled[name]
+            return {"name": name, "kind": "maven", "hash": self.maven_manager.get_hash(release), "release": release}
+        return None
+
+    def export(self, names: list, output: str, **kargs) -> bool:
+        """Export installed toolchains to a bundle
+
+        Args:
+            names (list): The names of the installed JDKs and Maven.
+            output (str): The bundle file relative to working_dir, `-` for stdout.
+
+        Returns:
+            bool: True if the bundle is written; False if a toolchain is not installed.
+        """
+        entries = []
+        for name in names:
+            entry = self.get_entry(name)
+            if entry is None:
+                print(f"No such installed JDK or Maven: {name}", file=sys.stderr)
+                return False
+            entries.append(entry)
+
+        index = json.dumps({"toolchains": entries}, default=dict).encode("utf-8")
+        out = sys.stdout.buffer if output == "-" else open(os.path.join(self.working_dir, output), "wb")
+        try:
+            with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) as gz, tarfile.open(fileobj=gz, mode="w|") as tar:
+                info = tarfile.TarInfo(INDEX_NAME)
+                info.size = len(index)
+                tar.addfile(info, io.BytesIO(index))
+                for entry in entries:
+                    print(f"Packing {entry['name']}", file=sys.stderr)
+                    # trees of a delta upgrade share files with their base by hardlinks. A link into another
+                    # tree can not be extracted when that tree is skipped on import, so every tree is written
+                    # with its own copy and only the links within the tree are kept
+                    tar.inodes.clear()
+                    tar.add(os.path.join("install", entry["name"]), f"install/{entry['name']}")
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+            else:
+                out.flush()
+        return True
+
+    def import_(self, input: str, **kargs) -> bool:
+        """Import toolchains from a bundle
+
+        The bundle is read as a stream. The trees are extracted into a staging
+        directory in `install` and renamed into place one by one, and their
+        catalog entries are added to `source` if they are missing.
+
+        Args:
+            input (str): The bundle file relative to working_dir, `-` for stdin.
+
+        Returns:
+            bool: True if the bundle is imported; False if a toolchain is installed under the same name from another archive.
+
+        Raises:
+            Exception: If the bundle is malformed.
+        """
+        source = sys.stdin.buffer if input == "-" else open(os.path.join(self.working_dir, input), "rb")
+        staging = os.path.join("install", f".bundle.{os.getpid()}")
+        extract_filter = getattr(tarfile, "data_filter", None)
+        try:
+            with tarfile.open(fileobj=source, mode="r|*") as tar:
+                member = tar.next()
+                if member is None or member.name != INDEX_NAME:
+                    raise Exception(f"{input} is not a jdkmgr bundle")
+                entries = {i["name"]: i for i in json.load(tar.extractfile(member))["toolchains"]}
+                installed_hash = self.jdk_manager.indstalled_hash | self.maven_manager.indstalled_hash
+                skipped = {i for i in entries if entries[i]["hash"] in installed_hash}
+                for name in sorted(skipped):
+                    print(f"{name} already installed", file=sys.stderr)
+                # another toolchain under the same name may be the used one, it is never replaced
+                conflicts = {i for i in entries if i not in skipped and self.get_entry(i) is not None}
+                for name in sorted(conflicts):
+                    print(f"{name} is installed from another archive, remove it to import it", file=sys.stderr)
+                skipped |= conflicts
+
+                # iterating the TarFile would start over with index.json
+                for member in iter(tar.next, None):
+                    parts = member.name.split("/")
+                    if len(parts) < 2 or parts[0] != "install" or parts[1] not in entries or ".." in parts:
+                        raise Exception(f"Unexpected member {member.name} in {input}")
+                    if parts[1] in skipped:
+                        continue
+                    if extract_filter is not None:
+                        tar.extract(member, staging, filter=extract_filter)
+                    else:
+                        tar.extract(member, staging)
+
+            for name, entry in entries.items():
+                if name in skipped:
+                    continue
+                with FileLock(os.path.join("cache", f"{entry['hash']}.lock"), f"Waiting for another jdkmgr to install {name}"):
+                    target = os.path.join("install", name)
+                    # installed by another jdkmgr since the scan
+                    if os.path.exists(target):
+                        print(f"{name} already installed", file=sys.stderr)
+                        continue
+                    os.rename(os.path.join(staging, "install", name), target)
+                self.add_source(entry)
+                print(f"{name} imported", file=sys.stderr)
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self.jdk_manager.load_sources()
+        self.jdk_manager.scan_installed()
+        self.maven_manager.load_sources()
+        self.maven_manager.scan_installed()
+        return not conflicts
+
+    def add_source(self, entry: dict) -> None:
+        """Add the catalog entry of an imported toolchain to `source` if it is missing
+
+        Args:
+            entry (dict): The index entry of the toolchain.
+        """
+        if entry["kind"] == "jdk":
+            path, get_hash = os.path.join("source", "jdk.json"), lambda i: i["hash"]
+        else:
+            path, get_hash = os.path.join("source", "maven.json"), self.maven_manager.get_hash
+        with open(path) as f:
+            sources = json.load(f)
+        if any(get_hash(i) == entry["hash"] for i in sources):
+            return
+        sources.append(entry["release"])
+        with open(path + ".tmp", "w") as f:
+            json.dump(sources, f, indent=4)
+        os.replace(path + ".tmp", path)
+
@@ -0,0 +1,157 @@
+import os
+import re
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from utils import get_hash_algorithm, get_file_hash
+from catalog import iter_json_array
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class CacheServer:
+    """Cache server
+
+    Serves the archives in `cache` to peer machines over HTTP, keyed by the
+    catalog hash of the archive: `GET /<hash>`. Single byte ranges are
+    supported. A file is only served after its content has been checked
+    against the hash, the result is remembered until the file changes.
+
+    Peers use it by listing the server in the `peers` of their `config.json`,
+    see `utils.download`.
+
+    Typical usage:
+        >>> server = CacheServer("0.0.0.0", 8190)
+        >>> server.serve()
+    """
+
+    def __init__(self, bind: str = "0.0.0.0", port: int = 8190) -> None:
+        """Initialize the cache server
+
+        Args:
+            bind (str, optional): The address to listen on.
+            port (int, optional): The port to listen on.
+        """
+        self.lock = threading.Lock()
+        self.verified = {}
+        self.key_locks = {}
+        self.load_index()
+        self.httpd = ThreadingHTTPServer((bind, port), self.make_handler())
+        self.httpd.daemon_threads = True
+
+    def load_index(self) -> None:
+        """Map every catalog hash to the cache file of its archive"""
+        self.index = {}
+        # every platform is served, so the catalogs are streamed without a filter
+        if os.path.exists(os.path.join("source", "jdk.json")):
+            for i in iter_json_array(os.path.join("source", "jdk.json")):
+                self.index[i["hash"].lower()] = os.path.split(i["url"])[1]
+        if os.path.exists(os.path.join("source", "maven.json")):
+            for i in iter_json_array(os.path.join("source", "maven.json")):
+                for algorithm in ["sha512", "sha256", "sha1", "md5"]:
+                    if algorithm in i:
+                        self.index[i[algorithm].lower()] = os.path.split(i["url"])[1]
+
+    def get_file(self, hash_value: str) -> str:
+        """Get the verified cache file of a hash
+
+        Args:
+            hash_value (str): The catalog hash.
+
+        Returns:
+            str: The path of the file; None if it is unknown, missing or does not match the hash.
+        """
+        hash_value = hash_value.lower()
+        algorithm = get_hash_algorithm(hash_value)
+        if hash_value not in self.index or algorithm is None:
+            return None
+        path = os.path.join("cache", self.index[hash_value])
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        key = (hash_value, stat.st_size, stat.st_mtime_ns)
+        # the first request of a large archive hashes it for seconds, only the requests of the same
+        # file wait for it, the lock of the server is held just to look up and add the locks
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self.verified:
+                self.verified[key] = get_file_hash(path, algorithm) == hash_value
+            return path if self.verified[key] else None
+
+    def make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self.do_GET(head=True)
+
+            def do_GET(self, head=False):
+                path = server.get_file(self.path.strip("/"))
+                if path is None:
+                    self.send_error(404)
+                    return
+                size = os.path.getsize(path)
+                start, end = 0, size - 1
+                ranged = "Range" in self.headers
+                if ranged:
+                    match = RANGE_PATTERN.match(self.headers["Range"].strip())
+                    if match is None or match.groups() == ("", ""):
+                        self.send_range_error(size)
+                        return
+                    if match.group(1) == "":
+                        start = max(size - int(match.group(2)), 0)
+                    else:
+                        start = int(match.group(1))
+                        if match.group(2) != "":
+                            end = min(int(match.group(2)), size - 1)
+                    if start > end:
+                        self.send_range_error(size)
+                        return
+
+                self.send_response(206 if ranged else 200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(end - start + 1))
+                if ranged:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                self.end_headers()
+                if not head:
+                    with open(path, "rb") as f:
+                        self.connection.sendfile(f, start, end - start + 1)
+
+            def send_range_error(self, size: int) -> None:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        return Handler
+
+    def serve(self, **kargs) -> None:
+        """Serve until interrupted"""
+        host, port = self.httpd.server_address
+        print(f"jdkmgr cache listening on {host}:{port}")
+        try:
+            self.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.httpd.server_close()
+
+
+def add_parser(parsers: argparse.ArgumentParser) -> None:
+    """Add the `cache` commands
+
+    Args:
+        parsers (argparse.ArgumentParser): The top level subparsers.
+    """
+    parsers_cache = parsers.add_parser("cache", help="Archive cache").add_subparsers()
+    parser_serve = parsers_cache.add_parser("serve", help="Serve the archive cache to peer machines")
+    parser_serve.add_argument("--bind", default="0.0.0.0", help="Address to listen on")
+    parser_serve.add_argument("--port", type=int, default=8190, help="Port to listen on")
+    parser_serve.set_defaults(func=lambda bind, port, **kargs: CacheServer(bind, port).serve())
@@ -0,0 +1,134 @@
+import sys
+import json
+from collections.abc import Mapping
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = "0123456789+-.eE"
+# values shared by many entries, interned so that every entry refers to the same string
+INTERNED = {"distribution", "abbreviate", "type", "os", "arch"}
+
+
+class Source(Mapping):
+    """A compact, read only catalog entry
+
+    Only the fields jdkmgr uses are kept, in slots instead of a dict, and the
+    values shared by many entries are interned. It reads like the dict from
+    the catalog: `source["url"]`, `source.get("type")`, `"sha512" in source`,
+    and `dict(source)` gives a dict for `json.dump`.
+    """
+    __slots__ = ("distribution", "abbreviate", "type", "os", "arch", "version", "url", "hash", "sha512", "sha256", "sha1", "md5")
+
+    def __init__(self, entry: dict) -> None:
+        for key in self.__slots__:
+            if key in entry:
+                value = entry[key]
+                setattr(self, key, sys.intern(value) if key in INTERNED and isinstance(value, str) else value)
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        return (key for key in self.__slots__ if hasattr(self, key))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"Source({dict(self)})"
+
+
+def iter_json_array(path: str, chunk_size: int = CHUNK_SIZE):
+    """Read the elements of a JSON array file one by one
+
+    The file is read in chunks and every element is decoded as soon as it is
+    complete, so only one chunk and one element are in memory at a time. The
+    array is checked as strictly as `json.load` would: one `,` between the
+    elements and nothing but whitespace after the `]`.
+
+    Example:
+    >>> for entry in iter_json_array("source/jdk.json"):
+    ...     print(entry["url"])
+
+    Args:
+        path (str): The file with a JSON array
+        chunk_size (int, optional): The number of characters read at once
+
+    Yields:
+        The decoded elements
+
+    Raises:
+        ValueError: If the file is no JSON array
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer, position, eof = f.read(chunk_size), 0, False
+        # characters of the file before the buffer, for the error messages
+        offset = 0
+        # "[" expected, then a "value" or "]", after an element a "," or "]", after the array nothing
+        expected = "["
+        while True:
+            while position < len(buffer) and buffer[position] in WHITESPACE:
+                position += 1
+            if position == len(buffer):
+                if eof:
+                    if expected == "end":
+                        return
+                    raise ValueError(f"{path}: unexpected end of file")
+                offset += len(buffer)
+                buffer, position = f.read(chunk_size), 0
+                eof = buffer == ""
+                continue
+            char = buffer[position]
+            if expected == "end":
+                raise ValueError(f"{path}: extra data after the array at character {offset + position}")
+            if expected == "[":
+                if char != "[":
+                    raise ValueError(f"{path}: no JSON array")
+                expected, position = "value or ]", position + 1
+                continue
+            if char == "]" and expected in ("value or ]", ", or ]"):
+                expected, position = "end", position + 1
+                continue
+            if expected == ", or ]":
+                if char != ",":
+                    raise ValueError(f"{path}: expected , or ] at character {offset + position}")
+                expected, position = "value", position + 1
+                continue
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                end = None
+            # an element which ends with the buffer may continue in the next chunk, also a number cut after its . or e
+            if end is None or (not eof and (end == len(buffer) or (
+                    isinstance(element, (int, float)) and all(i in NUMBER_CHARS for i in buffer[end:])))):
+                if eof:
+                    raise ValueError(f"{path}: invalid element at character {offset + position}")
+                chunk = f.read(chunk_size)
+                eof = chunk == ""
+                offset += position
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+            yield element
+            expected, position = ", or ]", end
+
+
+def load_catalog(path: str, accept=None) -> list:
+    """Load a catalog as a stream of compact entries
+
+    Example:
+    >>> load_catalog("source/jdk.json", lambda i: i["os"] == "Linux")
+
+    Args:
+        path (str): The catalog file, a JSON array of entries
+        accept (callable, optional): Called with each raw entry, entries for which it returns False are skipped
+
+    Returns:
+        list: Source entries in the order of the file
+    """
+    return [Source(i) for i in iter_json_array(path) if accept is None or accept(i)]
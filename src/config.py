@@ -0,0 +1,58 @@
+import os
+import json
+
+CONFIG_FILE = "config.json"
+
+
+def load_config(root: str = ".") -> dict:
+    """Read config.json of a jdkmgr root
+
+    Args:
+        root (str, optional): The jdkmgr root
+
+    Returns:
+        dict: The config, empty if there is no config.json
+    """
+    path = os.path.join(root, CONFIG_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_links(jdk_manager, maven_manager, root: str = ".") -> None:
+    """Take over the links and the profile from config.json, another jdkmgr may have changed them
+
+    Args:
+        jdk_manager (JDKManager): The JDK manager.
+        maven_manager (MavenManager): The Maven manager.
+        root (str, optional): The jdkmgr root
+    """
+    config = load_config(root)
+    jdk_manager.jdk_path = config.get("jdk")
+    maven_manager.maven_path = config.get("maven")
+    maven_manager.mvnd_path = config.get("mvnd")
+    maven_manager.profile = config.get("maven_profile")
+
+
+def save_config(jdk_manager, maven_manager, root: str = ".") -> None:
+    """Write the links and the profile of the managers to config.json, the other keys are kept
+
+    The file is replaced in one rename, so that a jdkmgr which reads it at the same time
+    never sees a half written file.
+
+    Args:
+        jdk_manager (JDKManager): The JDK manager.
+        maven_manager (MavenManager): The Maven manager.
+        root (str, optional): The jdkmgr root
+    """
+    config = load_config(root)
+    config["jdk"] = jdk_manager.jdk_path
+    config["maven"] = maven_manager.maven_path
+    config["mvnd"] = maven_manager.mvnd_path
+    config["maven_profile"] = maven_manager.profile
+    path = os.path.join(root, CONFIG_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(config, f)
+    os.replace(tmp, path)
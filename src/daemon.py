@@ -0,0 +1,477 @@
+import io
+import os
+import copy
+import json
+import time
+import signal
+import secrets
+import argparse
+import threading
+import http.client
+from urllib.parse import urlparse, parse_qs, quote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from config import CONFIG_FILE, load_links, save_config
+
+DAEMON_FILE = "daemon.json"
+
+
+class Job:
+    """Install job
+
+    An install job runs in its own thread. The progress is recorded so that
+    clients can poll it or stream it while it is running.
+
+    Attributes:
+        id (str): The id of the job.
+        kind (str): `java` or `mvn`.
+        name (str): The name of the toolchain to install.
+        state (str): `pending`, `running`, `done` or `failed`.
+        downloaded (int): Downloaded bytes.
+        total (int): Total bytes, 0 if unknown.
+        result (bool): The result of the install, None while running.
+        error (str): The error message if the job failed.
+        output (str): The messages of the manager, as a local install prints them.
+    """
+
+    def __init__(self, id: str, kind: str, name: str) -> None:
+        self.id = id
+        self.kind = kind
+        self.name = name
+        self.state = "pending"
+        self.downloaded = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.output = ""
+        self.changed = threading.Condition()
+
+    def update(self, **kargs) -> None:
+        """Update the job state and wake up streaming clients"""
+        with self.changed:
+            for key, value in kargs.items():
+                setattr(self, key, value)
+            self.changed.notify_all()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "name": self.name,
+            "state": self.state,
+            "downloaded": self.downloaded,
+            "total": self.total,
+            "result": self.result,
+            "error": self.error,
+            "output": self.output,
+        }
+
+
+def print_to_string(*args, **kargs) -> str:
+    """Get what print would print"""
+    output = io.StringIO()
+    print(*args, file=output, **kargs)
+    return output.getvalue()
+
+
+class DaemonServer:
+    """jdkmgr daemon
+
+    Keeps `JDKManager` and `MavenManager` in memory and serves them over
+    localhost HTTP, so that queries don't pay for an interpreter start and a
+    scan of `install` every time.
+    The `install` directory and the `source` catalogs are polled for changes
+    and reloaded when they change.
+
+    The address and an access token are written to `daemon.json`, which is
+    removed again when the daemon stops.
+
+    Routes:
+        GET  /ping
+        GET  /<java|mvn>/ls
+        GET  /<java|mvn>/resolve?name=<name>
+        POST /<java|mvn>/install   {"name": <name>}
+        POST /<java|mvn>/use       {"name": <name>}
+        POST /<java|mvn>/run       {"command": <ls|resolve|use>, "name": <name>}, the output of the CLI command
+        GET  /jobs/<id>
+        GET  /jobs/<id>/stream     newline delimited job states until the job ends
+
+    Typical usage:
+        >>> daemon = DaemonServer(jdk, maven)
+        >>> daemon.serve()
+    """
+
+    # CLI commands which can be run through `run`, and the manager methods behind them
+    COMMANDS = {"ls": "list", "resolve": "print_resolve", "use": "use"}
+
+    def __init__(self, jdk_manager, maven_manager, port: int = 0, interval: float = 1.0) -> None:
+        """Initialize the daemon
+
+        Args:
+            jdk_manager (JDKManager): The JDK manager to serve.
+            maven_manager (MavenManager): The Maven manager to serve.
+            port (int, optional): The port to listen on, 0 picks a free port.
+            interval (float, optional): Seconds between two checks for changes.
+        """
+        self.managers = {"java": jdk_manager, "mvn": maven_manager}
+        self.interval = interval
+        self.token = secrets.token_hex(16)
+        self.lock = threading.RLock()
+        self.jobs = {}
+        self.stamp = self.get_stamp()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.make_handler())
+        self.httpd.daemon_threads = True
+
+    @staticmethod
+    def get_stamp() -> tuple:
+        """Get the modification times of everything the managers load"""
+        stamp = []
+        for path in ["install", os.path.join("source", "jdk.json"), os.path.join("source", "maven.json"), CONFIG_FILE]:
+            stamp.append(os.stat(path).st_mtime_ns if os.path.exists(path) else None)
+        if os.path.isdir("install"):
+            for i in sorted(os.listdir("install")):
+                release = os.path.join("install", i, "release.json")
+                stamp.append(os.stat(release).st_mtime_ns if os.path.exists(release) else None)
+        return tuple(stamp)
+
+    def watch(self) -> None:
+        """Reload the managers whenever `install`, `source` or `config.json` changes"""
+        while True:
+            time.sleep(self.interval)
+            stamp = self.get_stamp()
+            if stamp != self.stamp:
+                with self.lock:
+                    try:
+                        for manager in self.managers.values():
+                            manager.load_sources()
+                            manager.scan_installed()
+                        load_links(self.managers["java"], self.managers["mvn"])
+                    except (OSError, ValueError) as e:
+                        # keep serving the last good state, e.g. while a catalog is rewritten
+                        print(f"reload failed: {e}")
+                        continue
+                    self.stamp = stamp
+
+    def load_links(self) -> None:
+        """Take over the links and the profile from config.json, local commands may have changed them"""
+        with self.lock:
+            try:
+                load_links(self.managers["java"], self.managers["mvn"])
+            except ValueError as e:
+                print(f"reload of {CONFIG_FILE} failed: {e}")
+
+    def list(self, kind: str) -> dict:
+        with self.lock:
+            self.load_links()
+            manager = self.managers[kind]
+            return {"installed": manager.get_installed(), "available": manager.get_available()}
+
+    def resolve(self, kind: str, name: str) -> dict:
+        with self.lock:
+            self.load_links()
+            return self.managers[kind].resolve(name)
+
+    def use(self, kind: str, name: str) -> dict:
+        with self.lock:
+            # save_config below writes all links, they must not be older than config.json
+            self.load_links()
+            manager = self.managers[kind]
+            result = manager.resolve(name)
+            if result is None or not result["installed"]:
+                return None
+            manager.use(result["name"])
+            save_config(self.managers["java"], self.managers["mvn"])
+            return result
+
+    def capture(self, call) -> tuple:
+        """Call a manager method with the messages of both managers collected instead of printed
+
+        Returns:
+            tuple: The result of the call and the messages.
+        """
+        output = io.StringIO()
+        with self.lock:
+            logs = {kind: manager.log for kind, manager in self.managers.items()}
+            for manager in self.managers.values():
+                manager.log = lambda *args, **kargs: output.write(print_to_string(*args, **kargs))
+            try:
+                result = call()
+            finally:
+                for kind, manager in self.managers.items():
+                    manager.log = logs[kind]
+        return result, output.getvalue()
+
+    def run(self, kind: str, command: str, name: str = None) -> dict:
+        """Run a CLI command with the formatting of the managers
+
+        Args:
+            kind (str): `java` or `mvn`.
+            command (str): `ls`, `resolve` or `use`.
+            name (str, optional): The name argument of the command.
+
+        Returns:
+            dict: The keys `result` and `output`, the text the command prints when it runs locally.
+        """
+        with self.lock:
+            self.load_links()
+            method = getattr(self.managers[kind], self.COMMANDS[command])
+            result, output = self.capture(lambda: method() if name is None else method(name))
+            if command == "use" and result:
+                save_config(self.managers["java"], self.managers["mvn"])
+            return {"result": result, "output": output}
+
+    def install(self, kind: str, name: str) -> Job:
+        """Start an install job
+
+        Args:
+            kind (str): `java` or `mvn`.
+            name (str): The name of the toolchain.
+
+        Returns:
+            Job: The started job.
+        """
+        job = Job(secrets.token_hex(4), kind, name)
+        self.jobs[job.id] = job
+
+        def run():
+            job.update(state="running")
+            try:
+                # the download runs on a copy, whose scan replaces its own dicts, so that the served state
+                # is only changed under the lock
+                worker = copy.copy(self.managers[kind])
+                worker.log = lambda *args, **kargs: job.update(output=job.output + print_to_string(*args, **kargs))
+                result = worker.install(name, progress=lambda downloaded, total: job.update(downloaded=downloaded, total=total))
+                with self.lock:
+                    self.managers[kind].scan_installed()
+                    self.stamp = self.get_stamp()
+                job.update(state="done", result=result)
+            except Exception as e:
+                job.update(state="failed", result=False, error=str(e))
+
+        threading.Thread(target=run, daemon=True).start()
+        return job
+
+    def make_handler(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, code: int, data) -> None:
+                # catalog entries are mappings, not dicts
+                body = json.dumps(data, default=dict).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def route(self):
+                if self.headers.get("X-Jdkmgr-Token") != daemon.token:
+                    self.send_json(403, {"error": "bad token"})
+                    return None
+                url = urlparse(self.path)
+                return url.path.strip("/").split("/"), {k: v[0] for k, v in parse_qs(url.query).items()}
+
+            def handle_one_request(self):
+                try:
+                    super().handle_one_request()
+                except Exception as e:
+                    self.send_json(500, {"error": str(e)})
+
+            def do_GET(self):
+                route = self.route()
+                if route is None:
+                    return
+                parts, query = route
+                if parts == ["ping"]:
+                    self.send_json(200, {"pid": os.getpid()})
+                elif len(parts) == 2 and parts[0] in daemon.managers and parts[1] == "ls":
+                    self.send_json(200, daemon.list(parts[0]))
+                elif len(parts) == 2 and parts[0] in daemon.managers and parts[1] == "resolve":
+                    result = daemon.resolve(parts[0], query.get("name", ""))
+                    self.send_json(200 if result else 404, result)
+                elif len(parts) >= 2 and parts[0] == "jobs" and parts[1] in daemon.jobs:
+                    job = daemon.jobs[parts[1]]
+                    if parts[2:] == ["stream"]:
+                        self.stream(job)
+                    else:
+                        self.send_json(200, job.to_dict())
+                else:
+                    self.send_json(404, {"error": f"no such route {self.path}"})
+
+            def do_POST(self):
+                route = self.route()
+                if route is None:
+                    return
+                parts, _ = route
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if len(parts) == 2 and parts[0] in daemon.managers and parts[1] == "install":
+                    self.send_json(202, daemon.install(parts[0], body.get("name", "")).to_dict())
+                elif len(parts) == 2 and parts[0] in daemon.managers and parts[1] == "use":
+                    result = daemon.use(parts[0], body.get("name", ""))
+                    self.send_json(200 if result else 404, result)
+                elif len(parts) == 2 and parts[0] in daemon.managers and parts[1] == "run" and body.get("command") in daemon.COMMANDS:
+                    self.send_json(200, daemon.run(parts[0], body["command"], body.get("name")))
+                else:
+                    self.send_json(404, {"error": f"no such route {self.path}"})
+
+            def stream(self, job: Job) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                last = None
+                while True:
+                    with job.changed:
+                        state = job.to_dict()
+                        if state == last and state["state"] not in ("done", "failed"):
+                            job.changed.wait(0.5)
+                            state = job.to_dict()
+                    if state != last:
+                        self.wfile.write(json.dumps(state).encode("utf-8") + b"\n")
+                        self.wfile.flush()
+                        last = state
+                    if state["state"] in ("done", "failed"):
+                        return
+
+        return Handler
+
+    def serve(self, **kargs) -> None:
+        """Serve until interrupted
+
+        The daemon file is written once the socket is bound and removed on exit.
+        """
+        host, port = self.httpd.server_address
+        with open(DAEMON_FILE, "w") as f:
+            json.dump({"host": host, "port": port, "pid": os.getpid(), "token": self.token}, f)
+        try:
+            os.chmod(DAEMON_FILE, 0o600)
+        except OSError:
+            pass
+        threading.Thread(target=self.watch, daemon=True).start()
+        signal.signal(signal.SIGTERM, lambda signum, frame: exit(0))
+        print(f"jdkmgr daemon listening on {host}:{port}")
+        try:
+            self.httpd.serve_forever()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            self.httpd.server_close()
+            if os.path.exists(DAEMON_FILE):
+                os.remove(DAEMON_FILE)
+
+
+class DaemonClient:
+    """Client of a running jdkmgr daemon
+
+    Typical usage:
+        >>> client = DaemonClient.connect()
+        >>> if client is not None:
+        ...     client.forward(["java", "ls"])
+    """
+
+    # commands that are answered by the daemon instead of a local manager
+    FORWARDED = {"ls": 0, "install": 1, "use": 1, "resolve": 1}
+
+    def __init__(self, host: str, port: int, token: str) -> None:
+        self.host = host
+        self.port = port
+        self.token = token
+
+    @classmethod
+    def connect(cls, timeout: float = 0.5):
+        """Connect to the daemon described by `daemon.json`
+
+        Args:
+            timeout (float, optional): Seconds to wait for the daemon to answer.
+
+        Returns:
+            DaemonClient: The client; None if no daemon is running.
+        """
+        if not os.path.exists(DAEMON_FILE):
+            return None
+        try:
+            with open(DAEMON_FILE) as f:
+                info = json.load(f)
+            client = cls(info["host"], info["port"], info["token"])
+            code, _ = client.request("GET", "/ping", timeout=timeout)
+            return client if code == 200 else None
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def request(self, method: str, path: str, body: dict = None, timeout: float = None):
+        """Send a request to the daemon
+
+        Returns:
+            tuple: The status code and the decoded JSON body.
+        """
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        try:
+            headers = {"X-Jdkmgr-Token": self.token, "Content-Type": "application/json"}
+            conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read() or b"null")
+        finally:
+            conn.close()
+
+    def stream(self, job_id: str):
+        """Yield the states of a job until it ends"""
+        conn = http.client.HTTPConnection(self.host, self.port)
+        try:
+            conn.request("GET", f"/jobs/{job_id}/stream", headers={"X-Jdkmgr-Token": self.token})
+            response = conn.getresponse()
+            for line in response:
+                yield json.loads(line)
+        finally:
+            conn.close()
+
+    def forward(self, argv: list) -> bool:
+        """Run a CLI command through the daemon
+
+        Args:
+            argv (list): The command line arguments without the program name.
+
+        Returns:
+            bool: True if the command has been handled by the daemon.
+        """
+        if len(argv) < 2 or argv[0] not in ("java", "mvn") or argv[1] not in self.FORWARDED:
+            return False
+        if len(argv) != 2 + self.FORWARDED[argv[1]] or any(i.startswith("-") for i in argv):
+            return False
+        kind, command = argv[0], argv[1]
+        if command != "install":
+            _, data = self.request("POST", f"/{kind}/run", {"command": command, "name": argv[2] if len(argv) > 2 else None})
+            print(data["output"], end="")
+            return True
+
+        from tqdm import tqdm
+        _, job = self.request("POST", f"/{kind}/install", {"name": argv[2]})
+        progress_bar = None
+        for job in self.stream(job["id"]):
+            if job["total"] and progress_bar is None:
+                progress_bar = tqdm(total=job["total"], unit='B', unit_scale=True)
+            if progress_bar is not None:
+                progress_bar.update(job["downloaded"] - progress_bar.n)
+        if progress_bar is not None:
+            progress_bar.close()
+        print(job["output"], end="")
+        if job["state"] == "failed":
+            print(f"Install of {argv[2]} failed: {job['error']}")
+        return True
+
+
+def add_parser(parsers: argparse.ArgumentParser, jdk_manager, maven_manager) -> None:
+    """Add the `serve` command
+
+    Args:
+        parsers (argparse.ArgumentParser): The top level subparsers.
+        jdk_manager (JDKManager): The JDK manager to serve.
+        maven_manager (MavenManager): The Maven manager to serve.
+    """
+    parser_serve = parsers.add_parser("serve", help="Run the jdkmgr daemon")
+    parser_serve.add_argument("--port", type=int, default=0, help="Port on 127.0.0.1, a free one by default")
+    parser_serve.add_argument("--interval", type=float, default=1.0, help="Seconds between checks for changes")
+    parser_serve.set_defaults(func=lambda port, interval, **kargs: DaemonServer(
+        jdk_manager, maven_manager, port, interval).serve())
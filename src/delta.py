@@ -0,0 +1,250 @@
+import io
+import os
+import mmap
+import zlib
+import shutil
+import zipfile
+import urllib3
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from manifest import write_manifest
+
+READAHEAD = 64 * 1024
+
+
+class RangeError(Exception):
+    """The server does not answer range requests, or a range ends before all of its bytes are received"""
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """Read only, seekable file over HTTP range requests
+
+    Reads are served from a window of bytes, so that the many small reads of
+    `zipfile` turn into a few range requests. The window is fed from one
+    streamed range request at a time, which is opened on demand for READAHEAD
+    bytes, or for a known extent through `fetch`. Bytes which were received
+    once are never requested again while the reads move forward, and the
+    window only keeps the bytes from the current position on, so an extent
+    of any size is streamed through it.
+
+    Example:
+    >>> with zipfile.ZipFile(HTTPRangeFile("https://example.com/file.zip")) as zip_ref:
+    ...     zip_ref.namelist()
+
+    Attributes:
+        url (str): The url of the file.
+        size (int): The size of the file.
+        transferred (int): The number of bytes received so far.
+    """
+
+    def __init__(self, url: str, session: requests.Session = None) -> None:
+        """Open the file
+
+        Args:
+            url (str): The url of the file.
+            session (requests.Session, optional): The session to send the requests with.
+
+        Raises:
+            RangeError: If the server ignores range requests.
+        """
+        self.url = url
+        self.session = session or requests.Session()
+        self.position = 0
+        self.transferred = 0
+        self.window_start = 0
+        self.window = b""
+        self.response = None
+        self.response_end = 0
+        response = self.session.get(url, headers={"Range": "bytes=0-0"})
+        response.raise_for_status()
+        if response.status_code != 206 or "Content-Range" not in response.headers:
+            raise RangeError(f"{url} does not support range requests")
+        self.size = int(response.headers["Content-Range"].rsplit("/", 1)[1])
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            self.position = self.size + offset
+        return self.position
+
+    def close(self) -> None:
+        self.close_response()
+        super().close()
+
+    @property
+    def window_end(self) -> int:
+        return self.window_start + len(self.window)
+
+    def close_response(self) -> None:
+        if self.response is not None:
+            self.response.close()
+            self.response = None
+
+    def fetch(self, start: int, end: int) -> None:
+        """Request the bytes from start to end, exclusive, they are streamed into the window as they are read
+
+        The bytes from start on which are in the window already are kept and
+        only the rest is requested.
+        """
+        if not self.window_start <= start <= self.window_end:
+            self.close_response()
+            self.window_start, self.window = start, b""
+        self.window = self.window[start - self.window_start:]
+        self.window_start = start
+        end = min(end, self.size)
+        if end <= self.window_end or (self.response is not None and end <= self.response_end):
+            return
+        self.close_response()
+        headers = {"Range": f"bytes={self.window_end}-{end - 1}", "Accept-Encoding": "identity"}
+        response = self.session.get(self.url, headers=headers, stream=True)
+        response.raise_for_status()
+        if response.status_code != 206:
+            response.close()
+            raise RangeError(f"{self.url} does not support range requests")
+        self.response = response
+        self.response_end = end
+
+    def receive(self, start: int, end: int) -> None:
+        """Read from the open request until the window reaches end, and drop the bytes before start"""
+        chunks = [self.window]
+        received = self.window_end
+        while received < end:
+            try:
+                chunk = self.response.raw.read(end - received)
+            except (urllib3.exceptions.HTTPError, OSError) as e:
+                # urllib3 raises on a body which ends before its Content-Length, or on a timeout
+                self.close_response()
+                raise RangeError(f"{self.url} failed at byte {received}: {e}") from e
+            if not chunk:
+                raise RangeError(f"{self.url} ended at byte {received} instead of {end}")
+            chunks.append(chunk)
+            received += len(chunk)
+            self.transferred += len(chunk)
+        # the reads of zipfile move forward, the bytes before the position are not needed again
+        self.window = b"".join(chunks)[start - self.window_start:]
+        self.window_start = start
+        if received == self.response_end:
+            self.close_response()
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.size - self.position
+        size = min(size, self.size - self.position)
+        if size <= 0:
+            return b""
+        end = self.position + size
+        streamed = end <= self.window_end or (self.response is not None and end <= self.response_end)
+        if self.position < self.window_start or not streamed:
+            self.fetch(self.position, self.position + max(size, READAHEAD))
+        if end > self.window_end:
+            self.receive(self.position, max(end, min(self.window_end + READAHEAD, self.response_end)))
+        offset = self.position - self.window_start
+        data = self.window[offset:offset + size]
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def crc32_file(path: str) -> int:
+    """Compute the CRC-32 of a file the way zip archives store it"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return zlib.crc32(data)
+
+
+def delta_install(url: str, base: str, dst: str, workers: int = None) -> dict:
+    """Build the tree of a zip archive at url from an installed base tree
+
+    The central directory of the archive serves as the delta manifest: files of
+    the base whose size and CRC-32 match a member are hard linked, or copied
+    where links are not possible. Only the other members are read from the
+    archive with range requests, and `zipfile` checks their CRC-32 while they
+    are extracted. The top level directory of the archive is stripped, the same
+    way `utils.extract` renames it.
+
+    Example:
+    >>> delta_install("https://example.com/jdk-17.0.1.zip", "install/jdk_17.0.0_amz", "install/.staging/jdk_17.0.1_amz")
+
+    Args:
+        url (str): The url of the target zip archive
+        base (str): The root of the installed base tree
+        dst (str): The directory to build the tree in, it must not exist
+        workers (int, optional): Number of threads which hash the base tree
+
+    Returns:
+        dict: The keys `reused`, `downloaded` (file counts), `transferred` and `size` (bytes)
+
+    Raises:
+        RangeError: If the server does not answer range requests
+        zipfile.BadZipFile: If the archive or a downloaded member is corrupted, or a member points out of dst
+    """
+    remote = HTTPRangeFile(url)
+    with zipfile.ZipFile(remote) as zip_ref:
+        members = [(i, i.filename.split("/", 1)[-1]) for i in zip_ref.infolist()]
+        members = [(info, relpath) for info, relpath in members if relpath and not info.is_dir()]
+        for info, relpath in members:
+            # the paths are joined to dst below, a member must not point out of it
+            normalized = os.path.normpath(relpath)
+            if os.path.isabs(normalized) or os.path.splitdrive(normalized)[0] or normalized.split(os.sep)[0] == os.pardir:
+                raise zipfile.BadZipFile(f"Unsafe member {info.filename} in {url}")
+
+        def unchanged(member) -> bool:
+            info, relpath = member
+            path = os.path.join(base, relpath)
+            return os.path.isfile(path) and not os.path.islink(path) and os.path.getsize(path) == info.file_size and crc32_file(path) == info.CRC
+
+        with ThreadPoolExecutor(workers) as executor:
+            reuse = list(executor.map(unchanged, members))
+
+        os.makedirs(dst)
+        stats = {"reused": 0, "downloaded": 0, "transferred": 0, "size": remote.size}
+        # a member extends from its local header to the next one, neighbouring changed
+        # members are streamed from one range request
+        members = sorted(zip(members, reuse), key=lambda i: i[0][0].header_offset)
+        ends = [i[0][0].header_offset for i in members[1:]] + [zip_ref.start_dir]
+        window_end = 0
+        for index, ((info, relpath), same) in enumerate(members):
+            if not same and ends[index] > window_end:
+                window_end = ends[index]
+                for next_index in range(index + 1, len(members)):
+                    if members[next_index][1]:
+                        break
+                    window_end = ends[next_index]
+                remote.fetch(info.header_offset, window_end)
+
+            path = os.path.join(dst, relpath)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if same:
+                try:
+                    os.link(os.path.join(base, relpath), path)
+                except OSError:
+                    shutil.copy2(os.path.join(base, relpath), path)
+                stats["reused"] += 1
+                continue
+            with zip_ref.open(info) as src, open(path, "wb") as f:
+                shutil.copyfileobj(src, f, 1024 * 1024)
+            mode = info.external_attr >> 16
+            if mode & 0o777:
+                os.chmod(path, mode & 0o777)
+            stats["downloaded"] += 1
+    stats["transferred"] = remote.transferred
+    write_manifest(dst, workers)
+    return stats
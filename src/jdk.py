@@ -1,8 +1,15 @@
 import os
+import shutil
 import platform
 import json
 import argparse
-from utils import download, extract_zip, create_link, get_avaliable_arches
+import zipfile
+import requests
+from utils import download, install_archive, install_tree, replace_link, get_avaliable_arches, get_hash_algorithm, parse_version, version_key, is_prerelease
+from delta import delta_install, RangeError
+from locking import FileLock
+from manifest import verify_install
+from catalog import load_catalog
 
 
 class JDKManager:
@@ -31,17 +38,36 @@ class JDKManager:
         >>> jdk.list()
     """
 
-    def __init__(self, parsers: argparse.ArgumentParser, jdk_path=None) -> None:
+    def __init__(self, parsers: argparse.ArgumentParser = None, jdk_path=None, peers=None, root: str = ".", log=print) -> None:
         """Initialize JDK Manager with current JDK path
 
         Args:
-            parsers (argparse.ArgumentParser): The argument parser.
-            jdk_path (str): The path of the current JDK.
+            parsers (argparse.ArgumentParser): The argument parser; no commands are added if None.
+            jdk_path (str): The path of the current JDK, relative to root.
+            peers (list): Base urls of peer cache servers which are tried before the vendor.
+            root (str): The directory with `source`, `install`, `cache` and the `jdk` link.
+            log (callable): Prints the messages and results, e.g. a function which does nothing.
 
         Raises:
             FileNotFoundError: If the source file of JDKs is not found.
         """
         self.jdk_path = jdk_path
+        self.peers = peers or []
+        self.root = root
+        self.log = log
+        # called with the paths of the old and the new JDK when `use` switches the JDK
+        self.switch_hooks = []
+        if parsers is not None:
+            self.add_parsers(parsers)
+        self.load_sources()
+        self.scan_installed()
+
+    def add_parsers(self, parsers: argparse.ArgumentParser) -> None:
+        """Add the JDK commands
+
+        Args:
+            parsers (argparse.ArgumentParser): The argument parser.
+        """
         parser_ls = parsers.add_parser('ls')
         parser_ls.set_defaults(func=self.list)
 
@@ -49,30 +75,64 @@ class JDKManager:
         parser_install.add_argument('name', help="Name of the JDK")
         parser_install.set_defaults(func=self.install)
 
+        parser_upgrade = parsers.add_parser('upgrade')
+        parser_upgrade.add_argument('name', help="Name of the JDK to upgrade to")
+        parser_upgrade.add_argument('--from', dest='base', help="Installed JDK to reuse unchanged files from")
+        parser_upgrade.set_defaults(func=self.upgrade)
+
         parser_use = parsers.add_parser('use')
         parser_use.add_argument(
             'name', type=str, help="JDK hash or JDK dir name")
         parser_use.set_defaults(func=self.use)
 
+        parser_remove = parsers.add_parser('remove')
+        parser_remove.add_argument('name', type=str, help="JDK dir name")
+        parser_remove.set_defaults(func=self.remove)
+
+        parser_verify = parsers.add_parser('verify')
+        parser_verify.add_argument('name', nargs='?', help="JDK dir name, all JDKs if omitted")
+        parser_verify.add_argument('--quick', action='store_true', help="Only compare size and mtime")
+        parser_verify.add_argument('--repair', action='store_true', help="Extract corrupted files again from the cached archive")
+        parser_verify.add_argument('-j', '--jobs', type=int, help="Number of hashing threads")
+        parser_verify.set_defaults(func=self.verify)
+
         parser_check = parsers.add_parser('check')
         parser_check.set_defaults(func=self.check)
 
-        # load JDK sources
-        if os.path.exists("source/jdk.json"):
-            with open("source/jdk.json") as f:
-                self.jdk_sources = json.load(f)
+        parser_resolve = parsers.add_parser('resolve')
+        parser_resolve.add_argument(
+            'name', type=str, help="JDK hash or JDK dir name")
+        parser_resolve.set_defaults(func=self.print_resolve)
+
+    def get_path(self, *paths: str) -> str:
+        """Get the path of a file under root"""
+        return os.path.normpath(os.path.join(self.root, *paths))
+
+    def load_sources(self) -> None:
+        """Load JDK sources from `source/jdk.json`
+
+        The catalog is read as a stream and only the JDKs for this platform are kept,
+        as compact `catalog.Source` entries.
+
+        Raises:
+            FileNotFoundError: If the source file of JDKs is not found.
+        """
+        if os.path.exists(self.get_path("source", "jdk.json")):
+            self.jdk_sources = load_catalog(self.get_path("source", "jdk.json"), self.is_avaliable)
         else:
             raise FileNotFoundError("No such file: source/jdk.json")
 
+    def scan_installed(self) -> None:
+        """Scan the `install` directory for installed JDKs"""
         self.indstalled = {}
         self.indstalled_hash = set()
-        if not os.path.exists("install"):
-            os.makedirs("install")
+        if not os.path.exists(self.get_path("install")):
+            os.makedirs(self.get_path("install"))
 
-        for i in os.listdir("install"):
+        for i in os.listdir(self.get_path("install")):
             if i.startswith("jdk_"):
-                if os.path.exists(os.path.join("install", i, "release.json")) and (os.path.exists(os.path.join("install", i, "bin", "javac")) or os.path.exists(os.path.join("install", i, "bin", "javac.exe"))):
-                    with open(os.path.join("install", i, "release.json")) as f:
+                if os.path.exists(self.get_path("install", i, "release.json")) and (os.path.exists(self.get_path("install", i, "bin", "javac")) or os.path.exists(self.get_path("install", i, "bin", "javac.exe"))):
+                    with open(self.get_path("install", i, "release.json")) as f:
                         self.indstalled[i] = json.load(f)
                         self.indstalled_hash.add(self.indstalled[i]["hash"])
 
@@ -96,6 +156,19 @@ class JDKManager:
         """
         return f"jdk_{jdk_source['version']}_{jdk_source['abbreviate'].lower()}"
 
+    @staticmethod
+    def get_hashs(jdk_source: dict) -> dict:
+        """Get the hash of the JDK archive as keyword arguments for `download`
+
+        Args:
+            jdk_source (dict): The source of the JDK.
+
+        Returns:
+            dict: The hash keyed by its algorithm; empty if the algorithm is unknown.
+        """
+        algorithm = get_hash_algorithm(jdk_source["hash"])
+        return {algorithm: jdk_source["hash"]} if algorithm is not None else {}
+
     def install(self, name: str, **kargs) -> bool:
         """install JDK
 
@@ -103,9 +176,12 @@ class JDKManager:
         If the JDK package is not found, it will download it from the internet.
         If the JDK is already installed, it will not be installed again.
         And it will generate a release.json file for the JDK.
+        Concurrent installs of the same JDK are serialized with a lock file in `cache`,
+        the processes that waited reuse the result instead of downloading it again.
 
         Args:
             name (str): The name of the JDK.
+            progress (callable, optional): Download progress callback, see `utils.download`.
 
         Returns:
             bool: True if the JDK is installed successfully; False otherwise.
@@ -120,34 +196,168 @@ class JDKManager:
             DownloadError: If the JDK Link is unavailable.
         """
         for i in self.jdk_sources:
-            if self.generate_name(i) == name and platform.platform().__contains__(i["os"]) and i["arch"].lower() in get_avaliable_arches():
+            if self.generate_name(i) == name and self.is_avaliable(i):
 
                 # check if already installed
                 if i["hash"] in self.indstalled_hash:
-                    print(f"JDK {self.generate_name(i)} already installed")
+                    self.log(f"JDK {self.generate_name(i)} already installed")
                     return False
 
-                file_name = os.path.split(i["url"])[1]
-                file_path = os.path.join("cache", file_name)
-                os.makedirs(os.path.join("cache"), exist_ok=True)
-                download(i["url"], file_path)
-                install_name = self.generate_name(i)
-                extract_zip(file_path, "install", install_name)
+                # only one process downloads and extracts a JDK, the others wait and reuse it
+                with FileLock(self.get_path("cache", f"{i['hash']}.lock"), f"Waiting for another jdkmgr to install {name}", self.log):
+                    self.scan_installed()
+                    if i["hash"] in self.indstalled_hash:
+                        self.log(f"JDK {self.generate_name(i)} already installed")
+                        return False
+
+                    file_name = os.path.split(i["url"])[1]
+                    file_path = self.get_path("cache", file_name)
+                    os.makedirs(self.get_path("cache"), exist_ok=True)
+                    download(i["url"], file_path, progress=kargs.get("progress"), peers=self.peers, log=self.log, **self.get_hashs(i))
+                    install_name = self.generate_name(i)
+                    install_archive(file_path, self.get_path("install"), install_name, i)
 
-                # write realse info
-                with open(os.path.join("install", install_name, "release.json"), "w") as f:
-                    json.dump(i, f)
                 self.indstalled[install_name] = i
                 self.indstalled_hash.add(i["hash"])
                 return True
 
-        print(f"No such JDK: {name}")
+        self.log(f"No such JDK: {name}")
         return False
 
+    def find_base(self, jdk_source: dict) -> str:
+        """Find the installed JDK a JDK can be upgraded from
+
+        Args:
+            jdk_source (dict): The source of the JDK to upgrade to.
+
+        Returns:
+            str: The newest installed JDK of the same distribution and major version; None if there is none.
+        """
+        candidates = [i for i in self.indstalled
+                      if self.indstalled[i]["abbreviate"] == jdk_source["abbreviate"]
+                      and parse_version(self.indstalled[i]["version"])[:1] == parse_version(jdk_source["version"])[:1]]
+        return max(candidates, key=lambda i: version_key(self.indstalled[i]["version"]), default=None)
+
+    def upgrade(self, name: str, base: str = None, **kargs) -> bool:
+        """Install a JDK by patching an installed one
+
+        Files which did not change since the base JDK are linked from it, only the
+        changed files are fetched from the zip archive of the JDK with range requests,
+        see `delta.delta_install`. If there is no base JDK, the archive is not a zip
+        or the server does not support range requests, the full archive is installed.
+        The tree is not checked against the hash of the archive and is recorded as unverified.
+
+        Args:
+            name (str): The name of the JDK to upgrade to.
+            base (str): The installed JDK to reuse files from; by default the newest
+                installed JDK of the same distribution and major version.
+
+        Returns:
+            bool: True if the JDK is installed successfully; False otherwise.
+
+        Examples:
+            >>> jdk = JDKManager()
+            >>> jdk.upgrade("jdk_17.0.1_amz", "jdk_17.0.0_amz")
+            True
+        """
+        source = next((i for i in self.jdk_sources if self.generate_name(i) == name and self.is_avaliable(i)), None)
+        if source is None:
+            self.log(f"No such JDK: {name}")
+            return False
+        if source["hash"] in self.indstalled_hash:
+            self.log(f"JDK {name} already installed")
+            return False
+        if base is not None and base not in self.indstalled:
+            self.log(f"No such JDK {base}")
+            return False
+        base = base or self.find_base(source)
+        if base is None or not source["url"].endswith(".zip"):
+            self.log(f"No delta for {name}, installing the full archive")
+            return self.install(name, **kargs)
+
+        with FileLock(self.get_path("cache", f"{source['hash']}.lock"), f"Waiting for another jdkmgr to install {name}", self.log):
+            self.scan_installed()
+            if source["hash"] in self.indstalled_hash:
+                self.log(f"JDK {name} already installed")
+                return False
+            stats = {}
+            # zipfile checks the CRC-32 of every file, but the tree is never compared with the hash of the archive
+            release = dict(source, verified=False)
+            try:
+                install_tree(self.get_path("install"), name, release, lambda tree: stats.update(
+                    delta_install(source["url"], self.get_path("install", base), tree)))
+            except (RangeError, zipfile.BadZipFile, requests.RequestException) as e:
+                self.log(f"Delta upgrade failed: {e}")
+        if not stats:
+            self.log(f"Installing the full archive of {name}")
+            return self.install(name, **kargs)
+
+        self.indstalled[name] = release
+        self.indstalled_hash.add(source["hash"])
+        self.log(f"JDK {name} installed from {base}: {stats['reused']} files reused, {stats['downloaded']} downloaded, "
+              f"{stats['transferred']} of {stats['size']} bytes transferred")
+        return True
+
+    def get_upgrades(self) -> dict:
+        """Find the newest patch in the catalog for the installed JDKs
+
+        Returns:
+            dict: The JDK to upgrade to keyed by the newest installed JDK of its distribution and major version.
+                Pre-releases are left out.
+        """
+        upgrades = {}
+        for i in self.jdk_sources:
+            # early access builds are never upgraded to
+            if not self.is_avaliable(i) or i["hash"] in self.indstalled_hash or is_prerelease(i["version"]):
+                continue
+            base = self.find_base(i)
+            if base is None or version_key(i["version"]) <= version_key(self.indstalled[base]["version"]):
+                continue
+            if base not in upgrades or version_key(i["version"]) > version_key(upgrades[base]["version"]):
+                upgrades[base] = i
+        return {base: self.generate_name(upgrades[base]) for base in upgrades}
+
+    def auto_upgrade(self, remove_old: bool = False, **kargs) -> bool:
+        """Upgrade every installed JDK to the newest patch of its distribution and major version
+
+        The new JDK is installed next to the old one from its full archive, whose
+        hash is checked, while the old one stays in use. A delta upgrade can not be
+        checked against that hash, so it is not used here. Only after a checked
+        install the `jdk` link is switched, in one rename, if it pointed to the old one.
+
+        Args:
+            remove_old (bool): Remove the old JDKs after the switch instead of keeping them for a rollback.
+
+        Returns:
+            bool: True if all upgrades succeeded, also if there was nothing to upgrade.
+
+        Examples:
+            >>> jdk = JDKManager()
+            >>> jdk.auto_upgrade(remove_old=True)
+            True
+        """
+        self.load_sources()
+        self.scan_installed()
+        upgrades = self.get_upgrades()
+        if not upgrades:
+            self.log("All JDKs are up to date")
+        ok = True
+        for base, name in sorted(upgrades.items()):
+            self.log(f"Upgrading {base} to {name}")
+            if not self.install(name, **kargs):
+                self.log(f"{base} is left as it is")
+                ok = False
+                continue
+            if self.jdk_path == os.path.join("install", base):
+                self.use(name)
+            if remove_old:
+                self.remove(base)
+        return ok
+
     def use(self, name: str, **kargs):
         """Use JDK
 
-        It can use a JDK by changing the `jdk` link.
+        It can use a JDK by changing the `jdk` link, which is replaced in one rename.
         In windows, it needs administrator privileges.
 
         Args:
@@ -168,21 +378,92 @@ class JDKManager:
         """
         for i in self.indstalled:
             if self.indstalled[i]["hash"].startswith(name) or i == name:
-                if os.path.exists("jdk"):
-                    os.remove("jdk")
-                self.jdk_path = os.path.join("install", i)
-                create_link(os.path.join("install", i), "jdk")
-                print(
+                old_jdk_path, self.jdk_path = self.jdk_path, os.path.join("install", i)
+                replace_link(os.path.join("install", i), self.get_path("jdk"))
+                for hook in self.switch_hooks:
+                    hook(old_jdk_path and self.get_path(old_jdk_path), self.get_path(self.jdk_path))
+                self.log(
                     f"JDK {self.indstalled[i]['version']}({self.indstalled[i]['distribution']}) is now used")
+                if not self.indstalled[i].get("verified", True):
+                    self.log(f"Warning: {i} was built by a delta upgrade and never checked against the hash of its archive, "
+                             f"remove and install it again to check it")
                 return True
-        print(f"No such JDK {name}")
+        self.log(f"No such JDK {name}")
         return False
 
+    def remove(self, name: str, **kargs) -> bool:
+        """Remove an installed JDK
+
+        If the JDK is the current one, the `jdk` link is removed as well.
+
+        Args:
+            name (str): The dir name of the JDK.
+
+        Returns:
+            bool: True if the JDK is removed; False if it is not installed.
+        """
+        if name not in self.indstalled:
+            self.log(f"No such JDK {name}")
+            return False
+        with FileLock(self.get_path("cache", f"{self.indstalled[name]['hash']}.lock"), log=self.log):
+            if self.jdk_path == os.path.join("install", name):
+                if os.path.lexists(self.get_path("jdk")):
+                    os.remove(self.get_path("jdk"))
+                self.jdk_path = None
+            # drop release.json first so that a partly removed tree is never seen as installed
+            os.remove(self.get_path("install", name, "release.json"))
+            shutil.rmtree(self.get_path("install", name))
+        self.indstalled_hash.discard(self.indstalled[name]["hash"])
+        del self.indstalled[name]
+        self.log(f"JDK {name} is removed")
+        return True
+
+    def verify(self, name: str = None, quick: bool = False, repair: bool = False, jobs: int = None, **kargs) -> bool:
+        """Verify installed JDKs against their manifest
+
+        The files are hashed in parallel. With `repair`, corrupted files are extracted
+        again from the cached archive, which is downloaded if it is not cached anymore.
+
+        Args:
+            name (str): The dir name of the JDK; all installed JDKs if None.
+            quick (bool): Only compare size and mtime instead of hashing.
+            repair (bool): Extract corrupted files again.
+            jobs (int): Number of hashing threads.
+
+        Returns:
+            bool: True if all verified JDKs are intact.
+        """
+        # a damaged tree may have lost the files the scan looks for, so only release.json is required here
+        ok = True
+        for i in [name] if name is not None else sorted(i for i in os.listdir(self.get_path("install")) if i.startswith("jdk_")):
+            if not os.path.exists(self.get_path("install", i, "release.json")):
+                self.log(f"No such JDK {i}")
+                ok = False
+                continue
+            with open(self.get_path("install", i, "release.json")) as f:
+                source = json.load(f)
+            get_archive = (lambda source=source: self.fetch(source)) if repair else None
+            ok = verify_install(i, self.get_path("install", i), quick, jobs, get_archive, self.log) and ok
+        return ok
+
+    def fetch(self, jdk_source: dict) -> str:
+        """Download the archive of a JDK into `cache` if needed
+
+        Args:
+            jdk_source (dict): The source of the JDK.
+
+        Returns:
+            str: The path of the archive.
+        """
+        file_path = self.get_path("cache", os.path.split(jdk_source["url"])[1])
+        download(jdk_source["url"], file_path, peers=self.peers, log=self.log, **self.get_hashs(jdk_source))
+        return file_path
+
     def list(self, **kargs):
         """List All JDKs
 
         It can list all installed JDKs and all available JDKs.
-        The current JDK will be marked with `*`
+        The current JDK will be marked with `*`, a JDK built by a delta upgrade with `unverified`
 
         Examples:
             >>> jdk = JDKManager()
@@ -190,20 +471,97 @@ class JDKManager:
             True
             >>> jdk.list()
         """
-        print("Installed JDKs:")
-        for i in self.indstalled:
-            print(
-                f"{i:15s} - {self.indstalled[i]['version']}({self.indstalled[i]['distribution']})", end="")
-            if self.jdk_path == os.path.join("install", i):
-                print(" *")
+        self.log("Installed JDKs:")
+        for i in self.get_installed():
+            self.log(f"{i['name']:15s} - {i['version']}({i['distribution']})", end="")
+            if not i["verified"]:
+                self.log(" unverified", end="")
+            if i["used"]:
+                self.log(" *")
             else:
-                print()
+                self.log()
+
+        self.log("\nAvailable JDKs:")
+        for i in self.get_available():
+            self.log(f"{i['name']:15s} - {i['version']}({i['distribution']})")
 
-        print("\nAvailable JDKs:")
+    def get_installed(self) -> list:
+        """Get all installed JDKs
+
+        Returns:
+            list: A list of dicts with the keys `name`, `version`, `distribution`, `hash`, `used` and `verified`,
+                which is False for a tree built by a delta upgrade.
+        """
+        return [{
+            "name": i,
+            "version": self.indstalled[i]["version"],
+            "distribution": self.indstalled[i]["distribution"],
+            "hash": self.indstalled[i]["hash"],
+            "used": self.jdk_path == os.path.join("install", i),
+            "verified": self.indstalled[i].get("verified", True),
+        } for i in self.indstalled]
+
+    def get_available(self) -> list:
+        """Get all JDKs which can be installed on this platform
+
+        Returns:
+            list: A list of dicts with the keys `name`, `version`, `distribution` and `hash`.
+        """
+        return [{
+            "name": self.generate_name(i),
+            "version": i["version"],
+            "distribution": i["distribution"],
+            "hash": i["hash"],
+        } for i in self.jdk_sources if self.is_avaliable(i) and i["hash"] not in self.indstalled_hash]
+
+    @staticmethod
+    def is_avaliable(jdk_source: dict) -> bool:
+        """Check if the JDK source matches the current os and architecture
+
+        Args:
+            jdk_source (dict): The source of the JDK.
+
+        Returns:
+            bool: True if the JDK can be installed on this platform.
+        """
+        return platform.platform().__contains__(jdk_source["os"]) and jdk_source["arch"].lower() in get_avaliable_arches()
+
+    def resolve(self, name: str) -> dict:
+        """Resolve a JDK name or hash
+
+        Installed JDKs are matched by dir name or hash prefix, the same way as `use`.
+        Otherwise the available JDKs are matched by name, the same way as `install`.
+
+        Args:
+            name (str): The name or hash of the JDK.
+
+        Returns:
+            dict: The keys `name`, `installed`, `path` and `source`; None if nothing matches.
+        """
+        for i in self.indstalled:
+            if self.indstalled[i]["hash"].startswith(name) or i == name:
+                return {"name": i, "installed": True, "path": self.get_path("install", i), "source": self.indstalled[i]}
         for i in self.jdk_sources:
-            if platform.platform().__contains__(i["os"]) and i["arch"].lower() in get_avaliable_arches() and i["hash"] not in self.indstalled_hash:
-                print(
-                    f"{self.generate_name(i):15s} - {i['version']}({i['distribution']})")
+            if self.generate_name(i) == name and self.is_avaliable(i):
+                return {"name": name, "installed": False, "path": None, "source": i}
+        return None
+
+    def print_resolve(self, name: str, **kargs) -> bool:
+        """Print the result of `resolve`
+
+        Args:
+            name (str): The name or hash of the JDK.
+
+        Returns:
+            bool: True if the JDK is resolved; False otherwise.
+        """
+        result = self.resolve(name)
+        if result is None:
+            self.log(f"No such JDK: {name}")
+            return False
+        state = result["path"] if result["installed"] else "not installed"
+        self.log(f"{result['name']:15s} - {result['source']['version']}({result['source']['distribution']}) {state}")
+        return True
 
     def check(self, **kargs):
         """Check JDK
@@ -223,10 +581,10 @@ class JDKManager:
             True
         """
         
-        java_home = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../jdk"))
+        java_home = os.path.realpath(self.get_path("jdk"))
         env_java_home = os.path.realpath(os.environ.get("JAVA_HOME"))
         if not java_home == env_java_home:
-            print(f"JAVA_HOME is not set correctly.\nIt should be {java_home} instead of {os.environ['JAVA_HOME']}.\nPlease set JAVA_HOME to {java_home}")
+            self.log(f"JAVA_HOME is not set correctly.\nIt should be {java_home} instead of {os.environ['JAVA_HOME']}.\nPlease set JAVA_HOME to {java_home}")
             return False
         
         PATH = os.environ.get("PATH")
@@ -237,11 +595,11 @@ class JDKManager:
         PATH = [os.path.realpath(i) for i in PATH]
         java_home_bin = os.path.realpath(os.path.join(java_home, "bin"))
         if not java_home_bin in PATH:
-            print(f"PATH is not set correctly.")
+            self.log(f"PATH is not set correctly.")
             if platform.system() == "Windows":
-                print("You should add %JAVA_HOME%\\bin to PATH.")
+                self.log("You should add %JAVA_HOME%\\bin to PATH.")
             else:
-                print("You should add $JAVA_HOME/bin to PATH.")
+                self.log("You should add $JAVA_HOME/bin to PATH.")
             return False
-        print("JDK environment is correct.")
+        self.log("JDK environment is correct.")
         return True
\ No newline at end of file
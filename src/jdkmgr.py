@@ -1,26 +1,46 @@
 import os
-import json
-import platform
-import argparse
-from jdk import JDKManager
-from maven import MavenManager
-
-os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import sys
+import daemon
 
 if __name__ == '__main__':
-    config = {}
-    if os.path.exists("config.json"):
-        with open("config.json") as f:
-            config = json.load(f)
+    # paths given by the user are relative to the dir jdkmgr was started from
+    working_dir = os.getcwd()
+    # the commands work on the jdkmgr root, src/api.py offers the same without changing the dir
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+    # answer from the running daemon if there is one, before the managers and their dependencies are imported
+    client = daemon.DaemonClient.connect()
+    if client is not None and client.forward(sys.argv[1:]):
+        exit(0)
+
+    import argparse
+    from jdk import JDKManager
+    from maven import MavenManager
+    from bundle import BundleManager
+    from lockfile import LockfileManager
+    import cache
+    import autoupgrade
+    from config import load_config, save_config
+
+    config = load_config()
 
     parser = argparse.ArgumentParser(description="JDK Manager")
     subparsers = parser.add_subparsers()
 
     subparsers_java = subparsers.add_parser("java", help="JDK").add_subparsers()
     subparsers_maven = subparsers.add_parser("mvn", help="Maven").add_subparsers()
+    subparsers_bundle = subparsers.add_parser("bundle", help="Offline bundle").add_subparsers()
 
-    manager = JDKManager(subparsers_java, config.get("jdk", None))
-    maven_manager = MavenManager(subparsers_maven, config.get("maven", None))
+    manager = JDKManager(subparsers_java, config.get("jdk", None), config.get("peers", None))
+    maven_manager = MavenManager(subparsers_maven, config.get("maven", None), config.get("peers", None), config.get("mvnd", None),
+                                 profiles=config.get("maven_profiles", None), profile=config.get("maven_profile", None), working_dir=working_dir)
+    if config.get("mvnd_stop_on_switch", True):
+        manager.switch_hooks.append(maven_manager.on_jdk_switch)
+    BundleManager(subparsers_bundle, manager, maven_manager, working_dir=working_dir)
+    LockfileManager(subparsers, manager, maven_manager, working_dir=working_dir)
+    daemon.add_parser(subparsers, manager, maven_manager)
+    cache.add_parser(subparsers)
+    autoupgrade.add_parser(subparsers, manager, maven_manager)
 
     args = parser.parse_args()
     if args.__contains__("func"):
@@ -29,7 +49,4 @@ if __name__ == '__main__':
         parser.print_help()
         exit(1)
 
-    config["jdk"] = manager.jdk_path
-    config["maven"] = maven_manager.maven_path
-    with open("config.json", "w") as f:
-        json.dump(config, f)
+    save_config(manager, maven_manager)
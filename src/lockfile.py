@@ -0,0 +1,178 @@
+import os
+import json
+import argparse
+
+LOCKFILE_NAME = "jdkmgr.lock"
+
+
+class LockfileManager:
+    """Lockfile Manager
+
+    Records the installed JDKs and Maven with their hashes, and which ones are
+    used, in a lockfile, and brings a machine to the state of a lockfile.
+
+    A lockfile looks like
+
+        {
+            "jdk": {"installed": {"jdk_17.0.1_ms": "<hash>"}, "used": "jdk_17.0.1_ms"},
+            "maven": {"installed": {"maven_3.8.4": "<hash>"}, "used": "maven_3.8.4", "mvnd": null}
+        }
+
+    `maven.mvnd` is the mvnd which is used through the `mvnd` link, if any.
+    Trees built by a delta upgrade, which were not checked against the hash of
+    their archive, are listed under `unverified`; `sync` installs them again
+    from the full archive.
+
+    `sync` only installs what is missing, removes what is not listed and
+    switches the links that differ, so on an up to date machine it does
+    nothing but compare the lockfile with the scan of `install`.
+
+    Typical usage:
+        >>> lockfile = LockfileManager(parsers, jdk, maven)
+        >>> lockfile.lock("jdkmgr.lock")
+        >>> lockfile.sync("jdkmgr.lock")
+    """
+
+    def __init__(self, parsers: argparse.ArgumentParser, jdk_manager, maven_manager, working_dir: str = ".") -> None:
+        """Initialize Lockfile Manager
+
+        Args:
+            parsers (argparse.ArgumentParser): The top level subparsers.
+            jdk_manager (JDKManager): The JDK manager.
+            maven_manager (MavenManager): The Maven manager.
+            working_dir (str, optional): dir the lockfile path is relative to, the dir jdkmgr was started from
+        """
+        self.jdk_manager = jdk_manager
+        self.maven_manager = maven_manager
+        self.working_dir = working_dir
+
+        parser_lock = parsers.add_parser('lock', help="Write the installed JDKs and Maven to a lockfile")
+        parser_lock.add_argument('-f', '--file', default=LOCKFILE_NAME, help="Path of the lockfile")
+        parser_lock.set_defaults(func=self.lock)
+
+        parser_sync = parsers.add_parser('sync', help="Install, remove and use JDKs and Maven as listed in a lockfile")
+        parser_sync.add_argument('-f', '--file', default=LOCKFILE_NAME, help="Path of the lockfile")
+        parser_sync.add_argument('--dry-run', action='store_true', help="Only print the changes")
+        parser_sync.set_defaults(func=self.sync)
+
+    def get_state(self) -> dict:
+        """Get the current state in the lockfile format
+
+        Returns:
+            dict: The installed JDKs and Maven with their hashes and the used ones.
+        """
+        jdk_used = self.jdk_manager.jdk_path
+        if jdk_used is not None and (not os.path.lexists("jdk") or os.path.realpath("jdk") != os.path.realpath(jdk_used)):
+            jdk_used = None
+        maven_used = self.maven_manager.maven_path
+        if maven_used is not None and not os.path.lexists("maven"):
+            maven_used = None
+        mvnd_used = self.maven_manager.mvnd_path
+        if mvnd_used is not None and not os.path.lexists("mvnd"):
+            mvnd_used = None
+        jdk_installed = self.jdk_manager.get_installed()
+        maven_installed = self.maven_manager.get_installed()
+        state = {
+            "jdk": {
+                "installed": {i["name"]: i["hash"] for i in jdk_installed},
+                "used": os.path.basename(jdk_used) if jdk_used is not None else None,
+            },
+            "maven": {
+                "installed": {i["name"]: i["hash"] for i in maven_installed},
+                "used": maven_used,
+                "mvnd": mvnd_used,
+            },
+        }
+        for kind, installed in [("jdk", jdk_installed), ("maven", maven_installed)]:
+            unverified = sorted(i["name"] for i in installed if not i["verified"])
+            if unverified:
+                state[kind]["unverified"] = unverified
+        return state
+
+    def lock(self, file: str = LOCKFILE_NAME, **kargs) -> bool:
+        """Write the current state to a lockfile
+
+        Args:
+            file (str, optional): Path of the lockfile, relative to working_dir.
+
+        Returns:
+            bool: True if the lockfile is written.
+        """
+        with open(os.path.join(self.working_dir, file), "w") as f:
+            json.dump(self.get_state(), f, indent=4, sort_keys=True)
+        print(f"Lockfile {file} is written")
+        return True
+
+    def diff(self, wanted: dict) -> list:
+        """Compute the steps from the current state to a lockfile
+
+        Args:
+            wanted (dict): The content of a lockfile.
+
+        Returns:
+            list: Tuples of (kind, action, name) with action `remove`, `install` or `use`,
+                in the order in which they have to run.
+        """
+        current = self.get_state()
+        steps = []
+        for kind in ["jdk", "maven"]:
+            have = current[kind]["installed"]
+            want = wanted.get(kind, {}).get("installed", {})
+            # an unverified tree does not count as the install of its hash
+            unverified = set(current[kind].get("unverified", []))
+            for name in sorted(have):
+                if want.get(name) != have[name] or name in unverified:
+                    steps.append((kind, "remove", name))
+            for name in sorted(want):
+                if have.get(name) != want[name] or name in unverified:
+                    steps.append((kind, "install", name))
+            for key in ["used", "mvnd"]:
+                used = wanted.get(kind, {}).get(key)
+                if used is not None and (used != current[kind].get(key) or (kind, "install", used) in steps):
+                    steps.append((kind, "use", used))
+        return steps
+
+    def sync(self, file: str = LOCKFILE_NAME, dry_run: bool = False, **kargs) -> bool:
+        """Bring the installed JDKs and Maven to the state of a lockfile
+
+        Args:
+            file (str, optional): Path of the lockfile, relative to working_dir.
+            dry_run (bool, optional): Only print the steps.
+
+        Returns:
+            bool: True if the state matches the lockfile afterwards.
+
+        Raises:
+            FileNotFoundError: If the lockfile does not exist.
+        """
+        with open(os.path.join(self.working_dir, file)) as f:
+            wanted = json.load(f)
+        steps = self.diff(wanted)
+        if not steps:
+            print("Already in sync")
+            return True
+
+        managers = {"jdk": self.jdk_manager, "maven": self.maven_manager}
+        for kind, action, name in steps:
+            print(f"{action} {name}")
+            if dry_run:
+                continue
+            manager = managers[kind]
+            if action == "remove":
+                manager.remove(name)
+            elif action == "install":
+                source = manager.resolve(name)
+                have_hash = source is not None and not source["installed"] and self.get_hash(kind, source["source"]) == wanted[kind]["installed"][name]
+                if not have_hash:
+                    print(f"No {name} with hash {wanted[kind]['installed'][name]} in the catalog")
+                    return False
+                if not manager.install(name):
+                    return False
+            elif action == "use":
+                if not manager.use(name):
+                    return False
+        return True
+
+    def get_hash(self, kind: str, source: dict) -> str:
+        """Get the catalog hash of a JDK or Maven source"""
+        return source["hash"] if kind == "jdk" else self.maven_manager.get_hash(source)
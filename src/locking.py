@@ -0,0 +1,85 @@
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Cross process exclusive lock backed by a lock file
+
+    The lock is released when the file is closed, so a crashed process never
+    leaves a stale lock behind. The lock file itself is kept.
+
+    Typical usage:
+        >>> with FileLock("cache/d2b41fbea1d890e7824fdbc50f47d1c44d8ebe7b.lock"):
+        ...     pass
+
+    Attributes:
+        path (str): The path of the lock file.
+    """
+
+    def __init__(self, path: str, message: str = None, log=print) -> None:
+        """Initialize the lock
+
+        Args:
+            path (str): The path of the lock file.
+            message (str, optional): Printed when the lock is held by another process.
+            log (callable, optional): Prints the message.
+        """
+        self.path = path
+        self.message = message
+        self.log = log
+        self.file = None
+
+    def try_acquire(self) -> bool:
+        """Try to acquire the lock without waiting
+
+        Returns:
+            bool: True if the lock is acquired; False if another process holds it.
+        """
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self) -> None:
+        """Acquire the lock, waiting for other processes if needed"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.file = open(self.path, "a+")
+        if self.try_acquire():
+            return
+        if self.message is not None:
+            self.log(self.message)
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        else:
+            while not self.try_acquire():
+                time.sleep(0.1)
+
+    def release(self) -> None:
+        """Release the lock"""
+        if self.file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
@@ -0,0 +1,258 @@
+import os
+import mmap
+import shutil
+import json
+import stat
+import hashlib
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_NAME = "manifest.json"
+SKIPPED = {MANIFEST_NAME, "release.json"}
+NS_PER_SECOND = 10 ** 9
+
+
+def hash_file(path: str) -> str:
+    """Hash a file with blake2b through a memory map
+
+    hashlib releases the GIL while hashing the mapped pages, so several files
+    can be hashed in parallel from threads.
+
+    Example:
+    >>> hash_file("install/jdk_17.0.1_ms/bin/java.exe")
+
+    Args:
+        path (str): The file to hash
+
+    Returns:
+        str: The hex digest
+    """
+    hash_func = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                hash_func.update(data)
+    return hash_func.hexdigest()
+
+
+def list_files(root: str) -> list:
+    """List the regular files of a tree relative to its root, without following links
+
+    Args:
+        root (str): The root of the tree
+
+    Returns:
+        list: The relative paths with `/` as separator
+    """
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for i in filenames:
+            path = os.path.join(dirpath, i)
+            relpath = os.path.relpath(path, root).replace(os.sep, "/")
+            if relpath not in SKIPPED and not os.path.islink(path):
+                files.append(relpath)
+    return files
+
+
+def write_manifest(root: str, workers: int = None) -> dict:
+    """Write the manifest of a tree to root/manifest.json
+
+    The manifest maps every regular file to its size, mode, mtime and hash.
+
+    Example:
+    >>> write_manifest("install/jdk_17.0.1_ms")
+
+    Args:
+        root (str): The root of the tree
+        workers (int, optional): Number of hashing threads
+
+    Returns:
+        dict: The manifest
+    """
+    files = list_files(root)
+    with ThreadPoolExecutor(workers) as executor:
+        hashes = executor.map(lambda i: hash_file(os.path.join(root, i)), files)
+        manifest = {}
+        for relpath, digest in zip(files, hashes):
+            st = os.stat(os.path.join(root, relpath))
+            manifest[relpath] = {"size": st.st_size, "mode": stat.S_IMODE(st.st_mode), "mtime": st.st_mtime_ns, "hash": digest}
+    with open(os.path.join(root, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def load_manifest(root: str) -> dict:
+    """Load root/manifest.json
+
+    Returns:
+        dict: The manifest; None if the tree has none
+    """
+    path = os.path.join(root, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def update_manifest(root: str, paths: list) -> None:
+    """Record the current state of files which are changed on purpose, e.g. conf/settings.xml
+
+    Args:
+        root (str): The root of the tree
+        paths (list): The relative paths with `/` as separator; files which do not exist are dropped
+    """
+    manifest = load_manifest(root)
+    if manifest is None:
+        return
+    for relpath in paths:
+        path = os.path.join(root, relpath)
+        if not os.path.isfile(path):
+            manifest.pop(relpath, None)
+            continue
+        st = os.stat(path)
+        manifest[relpath] = {"size": st.st_size, "mode": stat.S_IMODE(st.st_mode), "mtime": st.st_mtime_ns, "hash": hash_file(path)}
+    with open(os.path.join(root, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f)
+
+
+def check_file(root: str, relpath: str, entry: dict, quick: bool = False) -> str:
+    """Check one file against its manifest entry
+
+    Args:
+        root (str): The root of the tree
+        relpath (str): The path relative to root
+        entry (dict): The manifest entry
+        quick (bool, optional): Only compare size and mtime, the mtime to the second
+
+    Returns:
+        str: The problem, None if the file matches
+    """
+    path = os.path.join(root, relpath)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return "missing"
+    if st.st_size != entry["size"]:
+        return f"size {st.st_size} instead of {entry['size']}"
+    if os.name != "nt" and stat.S_IMODE(st.st_mode) != entry["mode"]:
+        return f"mode {oct(stat.S_IMODE(st.st_mode))} instead of {oct(entry['mode'])}"
+    if quick:
+        # whole seconds, tar and zip archives of a bundle drop the fraction of the mtime
+        return None if st.st_mtime_ns // NS_PER_SECOND == entry["mtime"] // NS_PER_SECOND else "modified"
+    return None if hash_file(path) == entry["hash"] else "content differs"
+
+
+def verify_tree(root: str, quick: bool = False, workers: int = None) -> dict:
+    """Verify a tree against its manifest
+
+    Example:
+    >>> verify_tree("install/jdk_17.0.1_ms")
+    {}
+
+    Args:
+        root (str): The root of the tree
+        quick (bool, optional): Only compare size and mtime instead of hashing
+        workers (int, optional): Number of hashing threads
+
+    Returns:
+        dict: The problems keyed by relative path, empty if the tree is intact
+
+    Raises:
+        FileNotFoundError: If the tree has no manifest
+    """
+    manifest = load_manifest(root)
+    if manifest is None:
+        raise FileNotFoundError(f"No such file: {os.path.join(root, MANIFEST_NAME)}")
+    with ThreadPoolExecutor(workers) as executor:
+        results = executor.map(lambda i: check_file(root, i, manifest[i], quick), manifest)
+        return {relpath: problem for relpath, problem in zip(manifest, results) if problem is not None}
+
+
+def repair_tree(root: str, archive: str, paths: list) -> dict:
+    """Extract only the given files of a tree again from its archive
+
+    The top level directory of the archive is stripped, the same way `utils.extract` renames it.
+    The repaired files are checked against the manifest, whose mtimes are updated for them.
+
+    Args:
+        root (str): The root of the tree
+        archive (str): The zip or tar.gz archive the tree was installed from
+        paths (list): The relative paths to extract
+
+    Returns:
+        dict: The problems which remain after the repair, keyed by relative path
+
+    Raises:
+        Exception: If the archive is not supported
+    """
+    manifest = load_manifest(root)
+    wanted = set(paths)
+    if archive.endswith(".zip"):
+        with zipfile.ZipFile(archive) as zip_ref:
+            for info in zip_ref.infolist():
+                relpath = info.filename.split("/", 1)[-1]
+                if relpath in wanted:
+                    path = os.path.join(root, relpath)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with zip_ref.open(info) as src, open(path, "wb") as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+    elif archive.endswith(".tar.gz"):
+        with tarfile.open(archive, "r:gz") as tar_ref:
+            for member in tar_ref:
+                relpath = member.name.split("/", 1)[-1]
+                if relpath in wanted and member.isfile():
+                    path = os.path.join(root, relpath)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with tar_ref.extractfile(member) as src, open(path, "wb") as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+    else:
+        raise Exception(f"Extraction of {archive} not supported")
+
+    problems = {}
+    for relpath in paths:
+        path = os.path.join(root, relpath)
+        if os.path.exists(path):
+            os.chmod(path, manifest[relpath]["mode"])
+        problem = check_file(root, relpath, manifest[relpath])
+        if problem is None:
+            manifest[relpath]["mtime"] = os.stat(path).st_mtime_ns
+        else:
+            problems[relpath] = problem
+    with open(os.path.join(root, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f)
+    return problems
+
+
+def verify_install(name: str, root: str, quick: bool = False, workers: int = None, get_archive=None, log=print) -> bool:
+    """Verify an installed tree and print the problems
+
+    Args:
+        name (str): The name of the installed JDK or Maven
+        root (str): The root of the tree
+        quick (bool, optional): Only compare size and mtime instead of hashing
+        workers (int, optional): Number of hashing threads
+        get_archive (callable, optional): Returns the path of the cached archive of the tree;
+            if given, the corrupted files are extracted again from it
+        log (callable, optional): Prints the problems
+
+    Returns:
+        bool: True if the tree is intact, after the repair if any
+    """
+    if load_manifest(root) is None:
+        log(f"{name}: no manifest, install it again to create one")
+        return False
+    problems = verify_tree(root, quick, workers)
+    if not problems:
+        log(f"{name}: OK")
+        return True
+    for relpath in sorted(problems):
+        log(f"{name}: {relpath} {problems[relpath]}")
+    if get_archive is None:
+        return False
+    problems = repair_tree(root, get_archive(), list(problems))
+    for relpath in sorted(problems):
+        log(f"{name}: {relpath} still {problems[relpath]} after repair")
+    if not problems:
+        log(f"{name}: repaired")
+    return not problems
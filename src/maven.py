@@ -1,18 +1,40 @@
 import os
+import shutil
 import platform
 import json
-from utils import download, extract, create_link, get_avaliable_arches
+from utils import download, install_archive, install_tree, replace_link, get_avaliable_arches, parse_version, version_key, is_prerelease
+from delta import delta_install, RangeError
+from locking import FileLock
+from manifest import verify_install
+from catalog import load_catalog
+from mvnd import list_daemons, stop_daemon, is_within
+from profiles import get_profiles, validate_profile, write_profile, get_project_settings
 import argparse
+import zipfile
+import requests
 import subprocess
 
 class MavenManager:
 
-    def __init__(self, parsers: argparse.ArgumentParser, maven_path=None) -> None:
+    def __init__(self, parsers: argparse.ArgumentParser = None, maven_path=None, peers=None, mvnd_path=None, profiles=None, profile=None,
+                 root: str = ".", log=print, working_dir: str = ".") -> None:
         """Initialize MavenManager with maven_path
 
+        Sources with "type": "mvnd" in source/maven.json are Maven Daemon distributions.
+        They are named mvnd_<version>, may be restricted to an os and arch like JDKs,
+        and are used through the mvnd link instead of the maven link.
+
         Args:
-            parsers (argparse.ArgumentParser): parser for MavenManager
+            parsers (argparse.ArgumentParser, optional): parser for MavenManager, no commands are added if None
             maven_path (str, optional): path to the maven.
+            peers (list, optional): base urls of peer cache servers which are tried before the url
+            mvnd_path (str, optional): name of the used mvnd
+            profiles (dict, optional): build acceleration profiles in addition to the built-in ones, see profiles.PROFILES
+            profile (str, optional): name of the profile which is applied to the used Maven
+            root (str, optional): dir with source, install, cache and the maven and mvnd links
+            log (callable, optional): prints the messages and results, e.g. a function which does nothing
+            working_dir (str, optional): dir the project paths given by the user are relative to, the dir
+                jdkmgr was started from, as the CLI changes to root
 
         Raises:
             FileNotFoundError: if source/maven.json not found
@@ -22,6 +44,24 @@ class MavenManager:
             >>> maven = MavenManager("maven_3.6.3")
         """
         self.maven_path = maven_path
+        self.mvnd_path = mvnd_path
+        self.profiles = get_profiles(profiles)
+        self.profile = profile
+        self.peers = peers or []
+        self.root = root
+        self.log = log
+        self.working_dir = working_dir
+        if parsers is not None:
+            self.add_parsers(parsers)
+        self.load_sources()
+        self.scan_installed()
+
+    def add_parsers(self, parsers: argparse.ArgumentParser) -> None:
+        """add the Maven commands
+
+        Args:
+            parsers (argparse.ArgumentParser): parser for MavenManager
+        """
         maven_parser_ls = parsers.add_parser('ls', help='list all installed Maven and available Maven')
         maven_parser_ls.set_defaults(func=self.list)
 
@@ -29,29 +69,82 @@ class MavenManager:
         maven_parser_install.add_argument('name', help="Name of the Maven")
         maven_parser_install.set_defaults(func=self.install)
 
+        maven_parser_upgrade = parsers.add_parser('upgrade', help="Install Maven by patching an installed one")
+        maven_parser_upgrade.add_argument('name', help="Name of the Maven to upgrade to")
+        maven_parser_upgrade.add_argument('--from', dest='base', help="Installed Maven to reuse unchanged files from")
+        maven_parser_upgrade.set_defaults(func=self.upgrade)
+
         maven_parser_use = parsers.add_parser('use', help="Select Maven")
         maven_parser_use.add_argument('name', type=str, help="Maven hash or Maven dir name")
+        maven_parser_use.add_argument('--profile', help="Build acceleration profile to apply, see `mvn profile ls`")
+        maven_parser_use.add_argument('--project', help="Project dir to write .mvn/maven.config and .mvn/jvm.config to")
         maven_parser_use.set_defaults(func=self.use)
 
+        maven_parser_remove = parsers.add_parser('remove', help="Remove an installed Maven")
+        maven_parser_remove.add_argument('name', type=str, help="Maven dir name")
+        maven_parser_remove.set_defaults(func=self.remove)
+
+        maven_parser_verify = parsers.add_parser('verify', help="Verify installed Maven against their manifest")
+        maven_parser_verify.add_argument('name', nargs='?', help="Maven dir name, all Maven if omitted")
+        maven_parser_verify.add_argument('--quick', action='store_true', help="Only compare size and mtime")
+        maven_parser_verify.add_argument('--repair', action='store_true', help="Extract corrupted files again from the cached archive")
+        maven_parser_verify.add_argument('-j', '--jobs', type=int, help="Number of hashing threads")
+        maven_parser_verify.set_defaults(func=self.verify)
+
         maven_parser_check = parsers.add_parser('check', help="Check if Maven environment is set up correctly")
         maven_parser_check.set_defaults(func=self.check)
 
-        # load Maven sources
-        if os.path.exists("source/maven.json"):
-            with open("source/maven.json") as f:
-                self.maven_sources = json.load(f)
+        maven_parser_daemon = parsers.add_parser('daemon', help="Manage running mvnd daemons").add_subparsers()
+        maven_parser_daemon_status = maven_parser_daemon.add_parser('status', help="List running mvnd daemons")
+        maven_parser_daemon_status.set_defaults(func=self.daemon_status)
+        maven_parser_daemon_stop = maven_parser_daemon.add_parser('stop', help="Stop running mvnd daemons")
+        maven_parser_daemon_stop.add_argument('name', nargs='?', help="mvnd dir name, all mvnd if omitted")
+        maven_parser_daemon_stop.add_argument('--jdk', help="Only stop the daemons running on this JDK dir name")
+        maven_parser_daemon_stop.set_defaults(func=self.daemon_stop)
+        maven_parser_daemon_prune = maven_parser_daemon.add_parser('prune', help="Stop daemons of removed mvnd or of JDKs which are not used")
+        maven_parser_daemon_prune.set_defaults(func=self.daemon_prune)
+
+        maven_parser_profile = parsers.add_parser('profile', help="Manage build acceleration profiles").add_subparsers()
+        maven_parser_profile_ls = maven_parser_profile.add_parser('ls', help="List the profiles")
+        maven_parser_profile_ls.set_defaults(func=self.list_profiles)
+        maven_parser_profile_apply = maven_parser_profile.add_parser('apply', help="Write a profile to a Maven and optionally a project")
+        maven_parser_profile_apply.add_argument('name', help="Profile name")
+        maven_parser_profile_apply.add_argument('--maven', help="Maven dir name, the used Maven if omitted")
+        maven_parser_profile_apply.add_argument('--project', help="Project dir to write .mvn/maven.config and .mvn/jvm.config to")
+        maven_parser_profile_apply.set_defaults(func=self.apply_profile)
+
+        maven_parser_resolve = parsers.add_parser('resolve', help="Resolve a Maven name or hash")
+        maven_parser_resolve.add_argument('name', type=str, help="Maven hash or Maven dir name")
+        maven_parser_resolve.set_defaults(func=self.print_resolve)
+
+    def get_path(self, *paths: str) -> str:
+        """get the path of a file under root"""
+        return os.path.normpath(os.path.join(self.root, *paths))
+
+    def load_sources(self) -> None:
+        """load Maven sources from source/maven.json
+
+        The catalog is read as a stream and only the entries for this platform are kept, see JDKManager.load_sources
+
+        Raises:
+            FileNotFoundError: if source/maven.json not found
+        """
+        if os.path.exists(self.get_path("source", "maven.json")):
+            self.maven_sources = load_catalog(self.get_path("source", "maven.json"), self.is_avaliable)
         else:
             raise FileNotFoundError("No such file: source/maven.json")
 
+    def scan_installed(self) -> None:
+        """scan the install directory for installed Maven"""
         self.indstalled = {}
         self.indstalled_hash = set()
-        if not os.path.exists("install"):
-            os.makedirs("install")
+        if not os.path.exists(self.get_path("install")):
+            os.makedirs(self.get_path("install"))
 
-        for i in os.listdir("install"):
-            if i.startswith("maven_"):
-                if os.path.exists(os.path.join("install", i, "release.json")) and (os.path.exists(os.path.join("install", i, "bin", "mvn")) or os.path.exists(os.path.join("install", i, "bin", "mvn.cmd"))):
-                    with open(os.path.join("install", i, "release.json")) as f:
+        for i in os.listdir(self.get_path("install")):
+            if i.startswith(("maven_", "mvnd_")):
+                if os.path.exists(self.get_path("install", i, "release.json")) and any(os.path.exists(self.get_path("install", i, "bin", j)) for j in ["mvn", "mvn.cmd", "mvnd", "mvnd.cmd", "mvnd.exe", "mvnd.sh"]):
+                    with open(self.get_path("install", i, "release.json")) as f:
                         self.indstalled[i] = json.load(f)
                         self.indstalled_hash.add(
                             self.get_hash(self.indstalled[i]))
@@ -94,7 +187,7 @@ class MavenManager:
 
     @staticmethod
     def generate_name(maven_source: dict) -> str:
-        """Generate a name for the Maven source with the following format: maven_<version>
+        """Generate a name for the Maven source with the following format: maven_<version>, or mvnd_<version> for mvnd
 
         Args:
             maven_source (dict): maven source
@@ -102,8 +195,26 @@ class MavenManager:
         Returns:
             str: name of the JDK
         """
+        if maven_source.get("type") == "mvnd":
+            return f"mvnd_{maven_source['version']}"
         return f"maven_{maven_source['version']}"
 
+    @staticmethod
+    def is_avaliable(maven_source: dict) -> bool:
+        """check if the Maven source can be installed on the current os and arch
+
+        Maven itself runs everywhere, mvnd distributions carry os and arch like JDK sources.
+
+        Args:
+            maven_source (dict): maven source
+
+        Returns:
+            bool: True if the source can be installed
+        """
+        if "os" in maven_source and not platform.platform().__contains__(maven_source["os"]):
+            return False
+        return "arch" not in maven_source or maven_source["arch"].lower() in get_avaliable_arches()
+
     def install(self, name: str, **kargs) -> bool:
         """install Maven
 
@@ -113,61 +224,446 @@ class MavenManager:
 
         Args:
             name (str): name of the Maven
+            progress (callable, optional): download progress callback, see utils.download
 
         Returns:
             bool: True if installed successfully else False
         """
         for i in self.maven_sources:
-            if self.generate_name(i) == name:
+            if self.generate_name(i) == name and self.is_avaliable(i):
 
                 # check if already installed
                 if self.get_hash(i) in self.indstalled_hash:
-                    print(f"Maven {self.generate_name(i)} already installed")
+                    self.log(f"Maven {self.generate_name(i)} already installed")
                     return False
 
-                file_name = os.path.split(i["url"])[1]
-                file_path = os.path.join("cache", file_name)
-                os.makedirs(os.path.join("cache"), exist_ok=True)
-                download(i["url"], file_path, **self.get_hashs(i))
-                extract(file_path, "install", self.generate_name(i))
+                # only one process downloads and extracts a Maven, the others wait and reuse it
+                with FileLock(self.get_path("cache", f"{self.get_hash(i)}.lock"), f"Waiting for another jdkmgr to install {name}", self.log):
+                    self.scan_installed()
+                    if self.get_hash(i) in self.indstalled_hash:
+                        self.log(f"Maven {self.generate_name(i)} already installed")
+                        return False
+
+                    file_name = os.path.split(i["url"])[1]
+                    file_path = self.get_path("cache", file_name)
+                    os.makedirs(self.get_path("cache"), exist_ok=True)
+                    download(i["url"], file_path, progress=kargs.get("progress"), peers=self.peers, log=self.log, **self.get_hashs(i))
+                    install_archive(file_path, self.get_path("install"), self.generate_name(i), i)
 
-                # create release.json
-                with open(os.path.join("install", self.generate_name(i), "release.json"), "w") as f:
-                    json.dump(i, f)
                 self.indstalled[self.generate_name(i)] = i
                 self.indstalled_hash.add(self.get_hash(i))
 
                 return True
         
-        print(f"No such Maven {name}")
+        self.log(f"No such Maven {name}")
         return False
     
-    def use(self, name: str, **kargs) -> bool:
+    def find_base(self, maven_source: dict) -> str:
+        """find the installed Maven a Maven can be upgraded from
+
+        Args:
+            maven_source (dict): maven source to upgrade to
+
+        Returns:
+            str: the newest installed Maven with the same major and minor version, None if there is none
+        """
+        candidates = [i for i in self.indstalled
+                      if self.indstalled[i].get("type") == maven_source.get("type")
+                      and parse_version(self.indstalled[i]["version"])[:2] == parse_version(maven_source["version"])[:2]]
+        return max(candidates, key=lambda i: version_key(self.indstalled[i]["version"]), default=None)
+
+    def upgrade(self, name: str, base: str = None, **kargs) -> bool:
+        """install Maven by patching an installed one, see JDKManager.upgrade
+
+        Only the zip archive of the Maven can be patched, the full archive is installed otherwise.
+        A patched Maven is recorded as unverified.
+
+        Examples:
+        >>> maven = MavenManager()
+        >>> maven.upgrade("maven_3.8.4", "maven_3.8.3")
+
+        Args:
+            name (str): name of the Maven to upgrade to
+            base (str, optional): installed Maven to reuse files from, by default the newest
+                installed Maven with the same major and minor version
+
+        Returns:
+            bool: True if installed successfully else False
+        """
+        sources = [i for i in self.maven_sources if self.generate_name(i) == name and self.is_avaliable(i)]
+        if not sources:
+            self.log(f"No such Maven {name}")
+            return False
+        if name in self.indstalled:
+            self.log(f"Maven {name} already installed")
+            return False
+        if base is not None and base not in self.indstalled:
+            self.log(f"No such Maven {base}")
+            return False
+        base = base or self.find_base(sources[0])
+        source = next((i for i in sources if i["url"].endswith(".zip")), None)
+        if base is None or source is None:
+            self.log(f"No delta for {name}, installing the full archive")
+            return self.install(name, **kargs)
+
+        with FileLock(self.get_path("cache", f"{self.get_hash(source)}.lock"), f"Waiting for another jdkmgr to install {name}", self.log):
+            self.scan_installed()
+            if name in self.indstalled:
+                self.log(f"Maven {name} already installed")
+                return False
+            stats = {}
+            # zipfile checks the CRC-32 of every file, but the tree is never compared with the hash of the archive
+            release = dict(source, verified=False)
+            try:
+                install_tree(self.get_path("install"), name, release, lambda tree: stats.update(
+                    delta_install(source["url"], self.get_path("install", base), tree)))
+            except (RangeError, zipfile.BadZipFile, requests.RequestException) as e:
+                self.log(f"Delta upgrade failed: {e}")
+        if not stats:
+            self.log(f"Installing the full archive of {name}")
+            return self.install(name, **kargs)
+
+        self.indstalled[name] = release
+        self.indstalled_hash.add(self.get_hash(source))
+        self.log(f"Maven {name} installed from {base}: {stats['reused']} files reused, {stats['downloaded']} downloaded, "
+              f"{stats['transferred']} of {stats['size']} bytes transferred")
+        return True
+
+    def get_upgrades(self) -> dict:
+        """find the newest patch in the catalog for the installed Maven and mvnd
+
+        Returns:
+            dict: name of the Maven to upgrade to keyed by the newest installed Maven of its major and minor version,
+                pre-releases are left out
+        """
+        upgrades = {}
+        for i in self.maven_sources:
+            # alphas, betas, milestones and release candidates are never upgraded to
+            if not self.is_avaliable(i) or self.generate_name(i) in self.indstalled or is_prerelease(i["version"]):
+                continue
+            base = self.find_base(i)
+            if base is None or version_key(i["version"]) <= version_key(self.indstalled[base]["version"]):
+                continue
+            if base not in upgrades or version_key(i["version"]) > version_key(upgrades[base]["version"]):
+                upgrades[base] = i
+        return {base: self.generate_name(upgrades[base]) for base in upgrades}
+
+    def auto_upgrade(self, remove_old: bool = False, **kargs) -> bool:
+        """upgrade every installed Maven to the newest patch, see JDKManager.auto_upgrade
+
+        Examples:
+        >>> maven = MavenManager()
+        >>> maven.auto_upgrade()
+
+        Args:
+            remove_old (bool, optional): remove the old Maven after the switch instead of keeping it for a rollback
+
+        Returns:
+            bool: True if all upgrades succeeded, also if there was nothing to upgrade
+        """
+        self.load_sources()
+        self.scan_installed()
+        upgrades = self.get_upgrades()
+        if not upgrades:
+            self.log("All Maven are up to date")
+        ok = True
+        for base, name in sorted(upgrades.items()):
+            self.log(f"Upgrading {base} to {name}")
+            # the full archive, whose hash is checked, see JDKManager.auto_upgrade
+            if not self.install(name, **kargs):
+                self.log(f"{base} is left as it is")
+                ok = False
+                continue
+            if base in (self.maven_path, self.mvnd_path):
+                self.use(name)
+            if remove_old:
+                self.remove(base)
+        return ok
+
+    def use(self, name: str, profile: str = None, project: str = None, **kargs) -> bool:
         """use Maven
 
+        The remembered profile is applied to the Maven before it is used, so that it
+        carries over to new versions. With a profile or a project, that profile or the
+        remembered one is applied first, and the Maven is not used if it does not support it.
+
         Examples:
         >>> maven = MavenManager()
-        >>> maven.use("maven_3.6.3")
+        >>> maven.use("maven_3.6.3", profile="fast", project="my-app")
 
         Args:
             name (str): name of the Maven
+            profile (str, optional): build acceleration profile to apply and remember
+            project (str, optional): project dir to write the profile to as well
 
         Returns:
             bool: True if used successfully else False
         """
         if name in self.indstalled:
-            if os.path.exists("maven"):
-                os.remove("maven")
-            create_link(os.path.join("install", name), "maven")
-            self.maven_path = name
-            print(f"Maven {name} is used")
+            link = self.get_link(name)
+            if profile is not None or project is not None:
+                if profile is None and self.profile is None:
+                    self.log(f"No profile to write to {project}, choose one with --profile")
+                    return False
+                if not self.apply_profile(profile or self.profile, name, project):
+                    return False
+            elif self.profile is not None and link == "maven":
+                self.apply_profile(self.profile, name)
+            replace_link(os.path.join("install", name), self.get_path(link))
+            if link == "mvnd":
+                self.mvnd_path = name
+            else:
+                self.maven_path = name
+            self.log(f"Maven {name} is used")
+            if not self.indstalled[name].get("verified", True):
+                self.log(f"Warning: {name} was built by a delta upgrade and never checked against the hash of its archive, "
+                         f"remove and install it again to check it")
             return True
         else:
-            print(f"No such Maven {name}")
+            self.log(f"No such Maven {name}")
             return False
     
+    @staticmethod
+    def get_link(name: str) -> str:
+        """get the link an installed Maven is used through: mvnd for mvnd, maven otherwise
+
+        Args:
+            name (str): name of the Maven
+
+        Returns:
+            str: path of the link
+        """
+        return "mvnd" if name.startswith("mvnd_") else "maven"
+
+    def remove(self, name: str, **kargs) -> bool:
+        """remove an installed Maven, and the maven link if it is the used one
+
+        Examples:
+        >>> maven = MavenManager()
+        >>> maven.remove("maven_3.6.3")
+
+        Args:
+            name (str): name of the Maven
+
+        Returns:
+            bool: True if removed successfully else False
+        """
+        if name not in self.indstalled:
+            self.log(f"No such Maven {name}")
+            return False
+        with FileLock(self.get_path("cache", f"{self.get_hash(self.indstalled[name])}.lock"), log=self.log):
+            if name in (self.maven_path, self.mvnd_path):
+                if os.path.lexists(self.get_path(self.get_link(name))):
+                    os.remove(self.get_path(self.get_link(name)))
+                if self.maven_path == name:
+                    self.maven_path = None
+                else:
+                    self.mvnd_path = None
+            # drop release.json first so that a partly removed tree is never seen as installed
+            os.remove(self.get_path("install", name, "release.json"))
+            shutil.rmtree(self.get_path("install", name))
+        self.indstalled_hash.discard(self.get_hash(self.indstalled[name]))
+        del self.indstalled[name]
+        self.log(f"Maven {name} is removed")
+        return True
+
+    def verify(self, name: str = None, quick: bool = False, repair: bool = False, jobs: int = None, **kargs) -> bool:
+        """verify installed Maven against their manifest, repair extracts corrupted files again
+
+        Examples:
+        >>> maven = MavenManager()
+        >>> maven.verify("maven_3.6.3", repair=True)
+
+        Args:
+            name (str, optional): name of the Maven, all installed Maven if None
+            quick (bool, optional): only compare size and mtime instead of hashing
+            repair (bool, optional): extract corrupted files again from the cached archive
+            jobs (int, optional): number of hashing threads
+
+        Returns:
+            bool: True if all verified Maven are intact else False
+        """
+        # a damaged tree may have lost the files the scan looks for, so only release.json is required here
+        ok = True
+        for i in [name] if name is not None else sorted(i for i in os.listdir(self.get_path("install")) if i.startswith(("maven_", "mvnd_"))):
+            if not os.path.exists(self.get_path("install", i, "release.json")):
+                self.log(f"No such Maven {i}")
+                ok = False
+                continue
+            with open(self.get_path("install", i, "release.json")) as f:
+                source = json.load(f)
+            get_archive = (lambda source=source: self.fetch(source)) if repair else None
+            ok = verify_install(i, self.get_path("install", i), quick, jobs, get_archive, self.log) and ok
+        return ok
+
+    def fetch(self, maven_source: dict) -> str:
+        """download the archive of a Maven into cache if needed
+
+        Args:
+            maven_source (dict): maven source
+
+        Returns:
+            str: path of the archive
+        """
+        file_path = self.get_path("cache", os.path.split(maven_source["url"])[1])
+        download(maven_source["url"], file_path, peers=self.peers, log=self.log, **self.get_hashs(maven_source))
+        return file_path
+
+    def get_daemons(self) -> list:
+        """get the running mvnd daemons with the installed mvnd and JDK they belong to
+
+        Returns:
+            list: dicts with the keys pid, home, java_home, mvnd and jdk; mvnd and jdk are
+                dir names in install, None if the daemon does not belong to an installed one
+        """
+        daemons = list_daemons()
+        for daemon in daemons:
+            daemon["mvnd"] = next((i for i in self.indstalled if daemon["home"] is not None and is_within(daemon["home"], self.get_path("install", i))), None)
+            daemon["jdk"] = next((i for i in os.listdir(self.get_path("install")) if i.startswith("jdk_") and is_within(daemon["java_home"], self.get_path("install", i))), None)
+        return daemons
+
+    def daemon_status(self, **kargs) -> list:
+        """print the running mvnd daemons
+
+        Examples:
+        >>> maven = MavenManager()
+        >>> maven.daemon_status()
+
+        Returns:
+            list: the daemons, see get_daemons
+        """
+        daemons = self.get_daemons()
+        if not daemons:
+            self.log("No mvnd daemon is running")
+        for daemon in daemons:
+            self.log(f"  {daemon['pid']:<8} {daemon['mvnd'] or daemon['home']}  on  {daemon['jdk'] or daemon['java_home']}")
+        return daemons
+
+    def daemon_stop(self, name: str = None, jdk: str = None, **kargs) -> int:
+        """stop running mvnd daemons
+
+        Examples:
+        >>> maven = MavenManager()
+        >>> maven.daemon_stop("mvnd_1.0.2", jdk="jdk_17.0.1_ms")
+
+        Args:
+            name (str, optional): only stop the daemons of this installed mvnd
+            jdk (str, optional): only stop the daemons running on this installed JDK
+
+        Returns:
+            int: number of stopped daemons
+        """
+        stopped = 0
+        for daemon in self.get_daemons():
+            if (name is None or daemon["mvnd"] == name) and (jdk is None or daemon["jdk"] == jdk):
+                if stop_daemon(daemon["pid"]):
+                    self.log(f"mvnd daemon {daemon['pid']} is stopped")
+                    stopped += 1
+                else:
+                    self.log(f"mvnd daemon {daemon['pid']} could not be stopped")
+        return stopped
+
+    def daemon_prune(self, **kargs) -> int:
+        """stop the daemons of mvnd which are not installed anymore and of JDKs which are not used
+
+        Only daemons of an mvnd in the install dir of this jdkmgr are considered, other mvnd
+        installations are left alone.
+
+        Examples:
+        >>> maven = MavenManager()
+        >>> maven.daemon_prune()
+
+        Returns:
+            int: number of stopped daemons
+        """
+        used_jdk = os.path.realpath(self.get_path("jdk")) if os.path.lexists(self.get_path("jdk")) else None
+        stopped = 0
+        for daemon in self.get_daemons():
+            if daemon["home"] is None or not is_within(daemon["home"], self.get_path("install")):
+                continue
+            if daemon["mvnd"] is None or used_jdk is None or not is_within(daemon["java_home"], used_jdk):
+                if stop_daemon(daemon["pid"]):
+                    self.log(f"mvnd daemon {daemon['pid']} is stopped")
+                    stopped += 1
+                else:
+                    self.log(f"mvnd daemon {daemon['pid']} could not be stopped")
+        return stopped
+
+    def on_jdk_switch(self, old_jdk_path: str, new_jdk_path: str) -> None:
+        """stop the mvnd daemons of a JDK which is not used anymore, see JDKManager.switch_hooks
+
+        Args:
+            old_jdk_path (str): path of the JDK used before, None if there was none
+            new_jdk_path (str): path of the JDK used now
+        """
+        if old_jdk_path is None or os.path.realpath(old_jdk_path) == os.path.realpath(new_jdk_path):
+            return
+        for daemon in self.get_daemons():
+            if is_within(daemon["java_home"], old_jdk_path):
+                if stop_daemon(daemon["pid"]):
+                    self.log(f"mvnd daemon {daemon['pid']} of {os.path.basename(old_jdk_path)} is stopped")
+                else:
+                    self.log(f"mvnd daemon {daemon['pid']} of {os.path.basename(old_jdk_path)} could not be stopped")
+
+    def apply_profile(self, name: str, maven: str = None, project: str = None, **kargs) -> bool:
+        """write a build acceleration profile to an installed Maven and remember it
+
+        See profiles.write_profile for the files which are written.
+
+        Examples:
+        >>> maven = MavenManager()
+        >>> maven.apply_profile("ci", "maven_3.8.4", "my-app")
+
+        Args:
+            name (str): name of the profile
+            maven (str, optional): name of the Maven, the used Maven by default
+            project (str, optional): project dir, relative to working_dir
+
+        Returns:
+            bool: True if applied successfully else False
+        """
+        maven = maven or self.maven_path
+        if name not in self.profiles:
+            self.log(f"No such profile {name}")
+            return False
+        if maven is None or maven not in self.indstalled:
+            self.log(f"No such Maven {maven}")
+            return False
+        if self.get_link(maven) == "mvnd":
+            self.log(f"Profiles apply to Maven, {maven} is an mvnd")
+            return False
+        if project is not None:
+            project = os.path.abspath(os.path.join(self.working_dir, project))
+            if not os.path.isdir(project):
+                self.log(f"No such project {project}")
+                return False
+        problems = validate_profile(self.profiles[name], self.indstalled[maven]["version"], project)
+        for problem in problems:
+            self.log(f"Profile {name} can not be applied to {maven}: {problem}")
+        if problems:
+            return False
+        for path in write_profile(name, self.profiles[name], self.get_path("install", maven), project, self.log):
+            self.log(f"{path} is updated")
+        self.profile = name
+        left_out = get_project_settings(self.profiles[name]) if project is None else []
+        if left_out:
+            self.log(f"Profile {name} is applied to {maven} without {', '.join(left_out)}, they are only written to a project with --project")
+        else:
+            self.log(f"Profile {name} is applied to {maven}")
+        return True
+
+    def list_profiles(self, **kargs) -> None:
+        """list the build acceleration profiles, the remembered one is marked with *
+
+        Examples:
+        >>> maven = MavenManager()
+        >>> maven.list_profiles()
+        """
+        for name, profile in self.profiles.items():
+            self.log(f"  {name:10s} {'*' if name == self.profile else ' '} {profile.get('description', '')}")
+
     def list(self, **kargs) -> None:
-        """list all installed Maven
+        """list all installed Maven, the used ones marked with `*` and the ones built by a delta upgrade with `unverified`
 
         Examples:
         >>> maven = MavenManager()
@@ -177,21 +673,80 @@ class MavenManager:
             add more info
             print sorted by version
         """
-        print("Installed Maven:")
-        for i in self.indstalled:
-            print(f"  {i}",end="")
-            if self.generate_name(self.indstalled[i]) == self.maven_path:
-                print(" *")
+        self.log("Installed Maven:")
+        for i in self.get_installed():
+            self.log(f"  {i['name']}",end="")
+            if not i["verified"]:
+                self.log(" unverified", end="")
+            if i["used"]:
+                self.log(" *")
             else:
-                print()
+                self.log()
         
-        print("\nAvailable Maven:")
-        available_maven = set()
+        self.log("\nAvailable Maven:")
+        for i in self.get_available():
+            self.log(f"  {i['name']}")
+
+    def get_installed(self) -> list:
+        """get all installed Maven
+
+        Returns:
+            list: dicts with the keys name, version, hash, used and verified, which is False for a tree built by a delta upgrade
+        """
+        return [{
+            "name": i,
+            "version": self.indstalled[i]["version"],
+            "hash": self.get_hash(self.indstalled[i]),
+            "used": self.generate_name(self.indstalled[i]) in (self.maven_path, self.mvnd_path),
+            "verified": self.indstalled[i].get("verified", True),
+        } for i in self.indstalled]
+
+    def get_available(self) -> list:
+        """get all Maven which are not installed yet, one entry per name
+
+        Returns:
+            list: dicts with the keys name and version
+        """
+        available_maven = {}
         for i in self.maven_sources:
-            if self.generate_name(i) not in self.indstalled:
-                available_maven.add(self.generate_name(i))
-        for i in available_maven:
-            print(f"  {i}")
+            if self.generate_name(i) not in self.indstalled and self.is_avaliable(i):
+                available_maven[self.generate_name(i)] = {"name": self.generate_name(i), "version": i["version"]}
+        return list(available_maven.values())
+
+    def resolve(self, name: str) -> dict:
+        """resolve a Maven name or hash
+
+        Installed Maven are matched by dir name or hash prefix, the others by name.
+
+        Args:
+            name (str): name or hash of the Maven
+
+        Returns:
+            dict: the keys name, installed, path and source; None if nothing matches
+        """
+        for i in self.indstalled:
+            if i == name or self.get_hash(self.indstalled[i]).startswith(name):
+                return {"name": i, "installed": True, "path": self.get_path("install", i), "source": self.indstalled[i]}
+        for i in self.maven_sources:
+            if self.generate_name(i) == name and self.is_avaliable(i):
+                return {"name": name, "installed": False, "path": None, "source": i}
+        return None
+
+    def print_resolve(self, name: str, **kargs) -> bool:
+        """print the result of resolve
+
+        Args:
+            name (str): name or hash of the Maven
+
+        Returns:
+            bool: True if resolved else False
+        """
+        result = self.resolve(name)
+        if result is None:
+            self.log(f"No such Maven {name}")
+            return False
+        self.log(f"  {result['name']} {result['path'] if result['installed'] else 'not installed'}")
+        return True
 
     def check(self, **kargs) -> None:
         """check if Maven environment is set up correctly
@@ -201,10 +756,10 @@ class MavenManager:
         >>> maven.check()
         """
 
-        maven_home = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../maven"))
+        maven_home = os.path.realpath(self.get_path("maven"))
         env_maven_home = os.environ.get("MAVEN_HOME")
         if env_maven_home is None:
-            print("MAVEN_HOME is not set")
+            self.log("MAVEN_HOME is not set")
             return False
         
         PATH = os.environ.get("PATH")
@@ -216,24 +771,24 @@ class MavenManager:
         PATH = [os.path.realpath(i) for i in PATH]
         maven_home_bin = os.path.realpath(os.path.join(maven_home, "bin"))
         if maven_home_bin not in PATH:
-            print("PATH is not set correctly")
+            self.log("PATH is not set correctly")
             if platform.system() == "Windows":
-                print("Please add %MAVEN_HOME%\\bin to PATH")
+                self.log("Please add %MAVEN_HOME%\\bin to PATH")
             else:
-                print("Please add $MAVEN_HOME/bin to PATH")
+                self.log("Please add $MAVEN_HOME/bin to PATH")
             return False
         
         if platform.system() == "Windows":
             p = subprocess.Popen(["cmd", "/c", "where", "mvn"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             out, err = p.communicate()
             if p.returncode != 0:
-                print("Maven is not installed")
+                self.log("Maven is not installed")
                 return False
             if os.path.realpath(os.path.dirname(out.decode("utf-8").split("\r\n")[0])) != maven_home_bin:
-                print("Maven PATH is not set correctly")
-                print("There exists a Maven in PATH but not in $MAVEN_HOME/bin")
-                print("Please add $MAVEN_HOME/bin to PATH")
+                self.log("Maven PATH is not set correctly")
+                self.log("There exists a Maven in PATH but not in $MAVEN_HOME/bin")
+                self.log("Please add $MAVEN_HOME/bin to PATH")
                 return False
 
-        print("Maven environment is set up correctly")
+        self.log("Maven environment is set up correctly")
         return True
\ No newline at end of file
@@ -0,0 +1,120 @@
+import os
+import re
+import signal
+import platform
+import subprocess
+
+DAEMON_MARKER = "org.mvndaemon.mvnd"
+HOME_PATTERN = re.compile(r'-Dmvnd\.home=(.+)$')
+
+
+def parse_command_line(pid: int, args: list, executable: str = None) -> dict:
+    """Extract the mvnd home and the JDK of a daemon from its arguments
+
+    Args:
+        pid (int): The process id
+        args (list): The arguments of the process, the first one is the program
+        executable (str, optional): The resolved path of the java executable, if known
+
+    Returns:
+        dict: The keys pid, home and java_home; None if the process is no mvnd daemon
+    """
+    if not args:
+        return None
+    executable = executable or args[0]
+    if not os.path.basename(executable).lower().startswith("java"):
+        return None
+    if not any(i.startswith(DAEMON_MARKER) for i in args[1:]):
+        return None
+    match = next(filter(None, map(HOME_PATTERN.match, args)), None)
+    return {
+        "pid": pid,
+        "home": os.path.realpath(match.group(1).strip('"')) if match else None,
+        "java_home": os.path.realpath(os.path.dirname(os.path.dirname(executable))),
+    }
+
+
+def split_command_line(command_line: str) -> list:
+    """Split a command line as reported by ps or Windows, the program may be quoted"""
+    command_line = command_line.strip()
+    if command_line.startswith('"') and '"' in command_line[1:]:
+        end = command_line.index('"', 1)
+        return [command_line[1:end]] + command_line[end + 1:].split()
+    return command_line.split()
+
+
+def list_daemons() -> list:
+    """List the running mvnd daemons of all versions
+
+    On Linux the processes are read from /proc, where the java executable is
+    resolved even if the daemon was started through the `jdk` link. Other
+    systems are asked with `ps` or, on Windows, PowerShell.
+
+    Example:
+    >>> list_daemons()
+    [{'pid': 4242, 'home': '/opt/jdkmgr/install/mvnd_1.0.2', 'java_home': '/opt/jdkmgr/install/jdk_17.0.1_ms'}]
+
+    Returns:
+        list: dicts with the keys pid, home and java_home
+    """
+    daemons = []
+    if os.path.isdir("/proc/self"):
+        for i in os.listdir("/proc"):
+            if not i.isdigit():
+                continue
+            try:
+                with open(f"/proc/{i}/cmdline", "rb") as f:
+                    args = f.read().decode("utf-8", "replace").split("\0")
+                executable = os.readlink(f"/proc/{i}/exe")
+            except OSError:
+                continue
+            daemon = parse_command_line(int(i), args[:-1] if args[-1:] == [""] else args, executable)
+            if daemon is not None:
+                daemons.append(daemon)
+    elif platform.system() == "Windows":
+        command = "Get-CimInstance Win32_Process -Filter \"Name='java.exe'\" | ForEach-Object { \"$($_.ProcessId) $($_.CommandLine)\" }"
+        out = subprocess.run(["powershell", "-NoProfile", "-Command", command], capture_output=True, text=True).stdout
+        for line in out.splitlines():
+            pid, _, command_line = line.strip().partition(" ")
+            daemon = parse_command_line(int(pid), split_command_line(command_line)) if pid.isdigit() else None
+            if daemon is not None:
+                daemons.append(daemon)
+    else:
+        out = subprocess.run(["ps", "-eo", "pid=,args="], capture_output=True, text=True).stdout
+        for line in out.splitlines():
+            pid, _, command_line = line.strip().partition(" ")
+            daemon = parse_command_line(int(pid), split_command_line(command_line)) if pid.isdigit() else None
+            if daemon is not None:
+                daemons.append(daemon)
+    return daemons
+
+
+def stop_daemon(pid: int) -> bool:
+    """Ask a daemon to terminate
+
+    On Windows the daemon is a java.exe without a window, which only a forced
+    `taskkill` ends. Elsewhere it gets SIGTERM and the JVM runs its shutdown hooks.
+
+    Args:
+        pid (int): The process id of the daemon
+
+    Returns:
+        bool: True if the daemon is stopped or was gone already
+    """
+    if platform.system() == "Windows":
+        result = subprocess.run(["taskkill", "/F", "/PID", str(pid)], capture_output=True)
+        # 128: no such process
+        return result.returncode in (0, 128)
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    except PermissionError:
+        return False
+    return True
+
+
+def is_within(path: str, root: str) -> bool:
+    """Check if a resolved path is root or inside it"""
+    root = os.path.realpath(root)
+    return path == root or path.startswith(root + os.sep)
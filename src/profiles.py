@@ -0,0 +1,272 @@
+import os
+import re
+import json
+from xml.sax.saxutils import escape
+from utils import parse_version
+from manifest import update_manifest
+
+# Build acceleration profiles, config.json can add more or override them under "maven_profiles".
+# threads is passed as -T, options are more Maven arguments, jvm_options go to the JVM of Maven,
+# cds lets JDK 19+ keep a class data sharing archive of Maven in the project,
+# mirror, offline and local_repository are written to conf/settings.xml of the Maven.
+PROFILES = {
+    "default": {
+        "description": "Maven defaults",
+    },
+    "parallel": {
+        "description": "One build thread per core",
+        "threads": "1C",
+    },
+    "fast": {
+        "description": "Parallel build on a quick starting JVM",
+        "threads": "1C",
+        "jvm_options": ["-XX:+TieredCompilation", "-XX:TieredStopAtLevel=1", "-Xshare:auto"],
+        "cds": True,
+    },
+    "ci": {
+        "description": "Parallel batch build without transfer progress",
+        "threads": "1C",
+        "options": ["--batch-mode", "--no-transfer-progress"],
+        "jvm_options": ["-Xmx2g", "-XX:+UseParallelGC", "-Xshare:auto"],
+    },
+    "offline": {
+        "description": "Build from the local repository only",
+        "offline": True,
+    },
+}
+
+THREADS_VERSION = (3, 0)
+PROJECT_VERSION = (3, 3, 1)
+OPTION_VERSIONS = {
+    "-ntp": (3, 6, 1),
+    "--no-transfer-progress": (3, 6, 1),
+}
+CDS_ARCHIVE = "jdkmgr.jsa"
+# the .mvn files jdkmgr wrote to a project and their content, other files are never changed
+WRITTEN_FILE = "jdkmgr.json"
+BLOCK_BEGIN = "<!-- jdkmgr: begin of the profile {} -->"
+BLOCK_END = "<!-- jdkmgr: end -->"
+BLOCK_PATTERN = re.compile(r"\n[ \t]*<!-- jdkmgr: begin .*?<!-- jdkmgr: end -->", re.DOTALL)
+COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.DOTALL)
+SETTINGS_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<settings xmlns="http://maven.apache.org/SETTINGS/1.0.0"
+          xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+          xsi:schemaLocation="http://maven.apache.org/SETTINGS/1.0.0 https://maven.apache.org/xsd/settings-1.0.0.xsd">
+</settings>
+"""
+
+
+def get_profiles(custom: dict = None) -> dict:
+    """Get the built-in profiles merged with the ones from config.json
+
+    Args:
+        custom (dict, optional): Profiles by name, they replace built-in profiles of the same name
+
+    Returns:
+        dict: The profiles by name
+    """
+    profiles = dict(PROFILES)
+    profiles.update(custom or {})
+    return profiles
+
+
+def validate_profile(profile: dict, version: str, project: str = None) -> list:
+    """Check that a Maven version supports a profile
+
+    Example:
+    >>> validate_profile(PROFILES["ci"], "3.5.4", "my-app")
+    ['--no-transfer-progress needs Maven 3.6.1 or newer']
+
+    Args:
+        profile (dict): The profile
+        version (str): The version of the Maven
+        project (str, optional): The project the profile is written to
+
+    Returns:
+        list: The problems, empty if the profile can be applied
+    """
+    version = parse_version(version)
+    problems = []
+    if profile.get("threads") and version < THREADS_VERSION:
+        problems.append("-T needs Maven 3.0 or newer")
+    for option in profile.get("options", []):
+        if option in OPTION_VERSIONS and version < OPTION_VERSIONS[option]:
+            problems.append(f"{option} needs Maven {'.'.join(map(str, OPTION_VERSIONS[option]))} or newer")
+    if project is not None and version < PROJECT_VERSION:
+        problems.append(".mvn/maven.config and .mvn/jvm.config need Maven 3.3.1 or newer")
+    return problems
+
+
+def merge_settings(content: str, name: str, profile: dict, log=print) -> str:
+    """Merge the settings of a profile into the content of a settings.xml
+
+    The settings are added in blocks between jdkmgr comments, which replace the
+    blocks of an earlier profile, so everything else in the file is kept. A
+    `<localRepository>` or `<offline>` the file sets itself is left as it is,
+    the mirror is added to its `<mirrors>` if it has one.
+
+    Example:
+    >>> merge_settings(open("conf/settings.xml").read(), "offline", PROFILES["offline"])
+
+    Args:
+        content (str): The content of the settings.xml
+        name (str): The name of the profile
+        profile (dict): The profile
+        log (callable, optional): Prints the settings which are left out
+
+    Returns:
+        str: The merged content
+    """
+    content = BLOCK_PATTERN.sub("", content)
+    # the comments are blanked out with the same length, so that positions in it are positions in the content
+    active = COMMENT_PATTERN.sub(lambda match: " " * len(match.group(0)), content)
+    settings = re.search(r"<settings\b[^>]*>", active)
+    if settings is None:
+        log(f"No <settings> element, the profile {name} is not written to settings.xml")
+        return content
+
+    top = []
+    for tag, value in [("localRepository", profile.get("local_repository") and os.path.abspath(profile["local_repository"])),
+                       ("offline", profile.get("offline") and "true")]:
+        if not value:
+            continue
+        if re.search(rf"<{tag}\b", active):
+            log(f"settings.xml sets <{tag}> already, it is left as it is")
+            continue
+        top.append(f"  <{tag}>{escape(value)}</{tag}>")
+    blocks = []
+    if profile.get("mirror"):
+        mirror = ["<mirror>", "  <id>jdkmgr</id>", "  <mirrorOf>*</mirrorOf>", f"  <url>{escape(profile['mirror'])}</url>", "</mirror>"]
+        mirrors = re.search(r"<mirrors\s*>", active)
+        if mirrors is not None:
+            blocks.append((mirrors.end(), ["    " + i for i in mirror]))
+        elif re.search(r"<mirrors\s*/>", active):
+            log("settings.xml has an empty <mirrors/>, the mirror is left out")
+        else:
+            top += ["  <mirrors>"] + ["    " + i for i in mirror] + ["  </mirrors>"]
+    if top:
+        blocks.append((settings.end(), top))
+
+    for position, lines in sorted(blocks, reverse=True):
+        indent = re.match(r"[ \t]*", lines[0]).group(0)
+        block = [indent + BLOCK_BEGIN.format(escape(name).replace("--", "- -"))] + lines + [indent + BLOCK_END]
+        content = content[:position] + "".join("\n" + i for i in block) + content[position:]
+    return content
+
+
+def get_maven_config(profile: dict) -> list:
+    """Get the Maven arguments of a profile for .mvn/maven.config"""
+    args = []
+    if profile.get("threads"):
+        args.append(f"-T{profile['threads']}")
+    if profile.get("offline"):
+        args.append("--offline")
+    if profile.get("local_repository"):
+        args.append(f"-Dmaven.repo.local={os.path.abspath(profile['local_repository'])}")
+    return args + list(profile.get("options", []))
+
+
+def get_jvm_config(profile: dict, project: str) -> list:
+    """Get the JVM options of a profile for .mvn/jvm.config
+
+    The archive options are ignored by JDKs older than 19 instead of failing the build.
+    """
+    options = list(profile.get("jvm_options", []))
+    if profile.get("cds"):
+        archive = os.path.abspath(os.path.join(project, ".mvn", CDS_ARCHIVE))
+        options += ["-XX:+IgnoreUnrecognizedVMOptions", "-XX:+AutoCreateSharedArchive", f"-XX:SharedArchiveFile={archive}"]
+    return options
+
+
+def get_project_settings(profile: dict) -> list:
+    """Get the settings of a profile which only a project can take, see `write_profile`
+
+    Returns:
+        list: The Maven arguments, and `JVM options` if the profile has any
+    """
+    args = [f"-T{profile['threads']}"] if profile.get("threads") else []
+    args += list(profile.get("options", []))
+    if profile.get("jvm_options") or profile.get("cds"):
+        args.append("JVM options")
+    return args
+
+
+def write_file(path: str, content: str) -> None:
+    """Replace a file in one rename, which also unshares it if it is hard linked by a delta upgrade"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def read_file(path: str) -> str:
+    """Read a text file, None if it does not exist"""
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def write_profile(name: str, profile: dict, root: str, project: str = None, log=print) -> list:
+    """Write a profile to a Maven and optionally to a project
+
+    The profile is merged into conf/settings.xml of the Maven, see
+    `merge_settings`, which is recorded in its manifest so that `verify` does
+    not report it. In the project .mvn/maven.config and .mvn/jvm.config are
+    written, or removed if the profile has nothing for them, but only if they
+    do not exist or still have the content jdkmgr wrote, which is kept in
+    .mvn/jdkmgr.json. Files of the user are never changed.
+
+    Example:
+    >>> write_profile("fast", PROFILES["fast"], "install/maven_3.8.4", "my-app")
+
+    Args:
+        name (str): The name of the profile
+        profile (dict): The profile
+        root (str): The root of the installed Maven
+        project (str, optional): The root of a project
+        log (callable, optional): Prints the settings and files which are left as they are
+
+    Returns:
+        list: The written or removed files
+    """
+    changed = []
+    settings_path = os.path.join(root, "conf", "settings.xml")
+    current = read_file(settings_path)
+    base = current if current is not None else SETTINGS_TEMPLATE
+    content = merge_settings(base, name, profile, log)
+    if content != base:
+        os.makedirs(os.path.join(root, "conf"), exist_ok=True)
+        write_file(settings_path, content)
+        update_manifest(root, ["conf/settings.xml"])
+        changed.append(settings_path)
+    if project is None:
+        return changed
+
+    written_path = os.path.join(project, ".mvn", WRITTEN_FILE)
+    written = json.loads(read_file(written_path) or "{}")
+    for file_name, lines in [("maven.config", get_maven_config(profile)), ("jvm.config", get_jvm_config(profile, project))]:
+        path = os.path.join(project, ".mvn", file_name)
+        # one argument per line is read the same by Maven 3, which splits at whitespace, and Maven 4
+        content = "\n".join(lines) + "\n" if lines else None
+        current = read_file(path)
+        if content == current:
+            continue
+        if current is not None and written.get(file_name) != current:
+            if content is not None:
+                log(f"{path} was not written by jdkmgr, it is left as it is; the profile {name} would write: {' '.join(lines)}")
+            continue
+        if content is None:
+            os.remove(path)
+            written.pop(file_name, None)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_file(path, content)
+            written[file_name] = content
+        changed.append(path)
+
+    if written:
+        write_file(written_path, json.dumps(written))
+    elif os.path.exists(written_path):
+        os.remove(written_path)
+    return changed
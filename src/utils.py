@@ -1,12 +1,19 @@
 import ctypes
 import requests
+import urllib3
+import http.client
 import os
 import platform
 from tqdm import tqdm
 import zipfile
 import hashlib
 import tarfile
-
+import shutil
+import json
+import time
+import errno
+import re
+from manifest import write_manifest
 
 def is_admin() -> bool:
     """Check if the user is admin
@@ -42,20 +49,189 @@ def create_link(src: str, dst: str) -> None:
     os.symlink(src, dst)
 
 
-def download(url: str, dst: str, md5=None, sha1=None, sha256=None, sha512=None) -> None:
+def replace_link(src: str, dst: str) -> None:
+    """Point a soft dir link to another dir without a moment in which it is missing
+
+    A new link is created next to dst and renamed over it. Windows cannot rename
+    over an existing link, there dst is removed right before the rename.
+
+    Example:
+    >>> replace_link("install/jdk_17.0.2_ms", "jdk")
+
+    Args:
+        src (str): Source dir
+        dst (str): The link, it may not exist yet
+    """
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    os.symlink(src, tmp)
+    try:
+        os.replace(tmp, dst)
+    except OSError:
+        if not os.path.lexists(dst):
+            os.remove(tmp)
+            raise
+        os.remove(dst)
+        os.rename(tmp, dst)
+
+
+MIN_BLOCK_SIZE = 64 * 1024
+MAX_BLOCK_SIZE = 4 * 1024 * 1024
+PROGRESS_INTERVAL = 0.1
+
+
+def preallocate(fd: int, size: int) -> None:
+    """Reserve disk space for a file of the given size if the platform supports it
+
+    This keeps large downloads from fragmenting and fails early when the disk is full.
+
+    Args:
+        fd (int): File descriptor of the file
+        size (int): Expected size of the file in bytes, 0 if unknown
+    """
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError as e:
+        # not every file system supports it, only a full disk is fatal
+        if e.errno == errno.ENOSPC:
+            raise
+
+
+HASH_LENGTHS = {32: "md5", 40: "sha1", 64: "sha256", 128: "sha512"}
+PEER_TIMEOUT = 2
+# a request or a body which fails on the way, from requests, from urllib3 while decoding,
+# or from http.client and the socket while reading an unencoded body
+TRANSFER_ERRORS = (requests.RequestException, urllib3.exceptions.HTTPError, http.client.HTTPException, OSError)
+
+
+def get_hash_algorithm(value: str) -> str:
+    """Guess the hash algorithm of a hex digest from its length
+
+    Example:
+    >>> get_hash_algorithm("d2b41fbea1d890e7824fdbc50f47d1c44d8ebe7b")
+    'sha1'
+
+    Args:
+        value (str): The hex digest
+
+    Returns:
+        str: md5, sha1, sha256 or sha512; None if the length matches none of them
+    """
+    return HASH_LENGTHS.get(len(value))
+
+
+def receive(response: requests.Response, dst: str, total_size_in_bytes: int, hash_mod: str = None, progress=None) -> tuple:
+    """Write the body of a streamed response to dst
+
+    The body is read into a reused buffer whose size grows from MIN_BLOCK_SIZE to MAX_BLOCK_SIZE
+    while the reads come back full, and the progress is reported every PROGRESS_INTERVAL seconds.
+    An encoded body is decoded by urllib3, which allocates per read.
+
+    Args:
+        response (requests.Response): The streamed response
+        dst (str): The file to write to
+        total_size_in_bytes (int): The expected size, 0 if unknown
+        hash_mod (str, optional): The hash algorithm to compute while writing
+        progress (callable, optional): Called with (downloaded, total) bytes instead of showing a progress bar.
+
+    Returns:
+        tuple: The number of bytes written and the hex digest, None if no hash_mod is given
+    """
+    progress_bar = tqdm(total=total_size_in_bytes, unit='B', unit_scale=True, disable=progress is not None)
+    hash_func = getattr(hashlib, hash_mod)() if hash_mod is not None else None
+
+    # read straight from the http.client response into our buffer when the body is not encoded,
+    # urllib3 would allocate a new bytes object for every read. A body which ends before the
+    # Content-Length is not reported by http.client, download compares the size instead
+    stream = response.raw
+    if not response.headers.get('content-encoding') and hasattr(getattr(stream, '_fp', None), 'readinto'):
+        stream = stream._fp
+    else:
+        stream.decode_content = True
+
+    buffer = bytearray(MAX_BLOCK_SIZE)
+    view = memoryview(buffer)
+    block_size = MIN_BLOCK_SIZE
+    downloaded = 0
+    reported = 0
+    last_report = time.monotonic()
+    with open(dst, 'wb') as file:
+        preallocate(file.fileno(), total_size_in_bytes)
+        while True:
+            size = stream.readinto(view[:block_size])
+            if not size:
+                break
+            chunk = view[:size]
+            file.write(chunk)
+            if hash_func is not None:
+                hash_func.update(chunk)
+            downloaded += size
+            # the network keeps up with us, read more per iteration
+            if size == block_size and block_size < MAX_BLOCK_SIZE:
+                block_size *= 2
+
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_INTERVAL:
+                progress_bar.update(downloaded - reported)
+                reported = downloaded
+                last_report = now
+                if progress is not None:
+                    progress(downloaded, total_size_in_bytes)
+        if file.tell() != total_size_in_bytes:
+            file.truncate()
+    response.close()
+    progress_bar.update(downloaded - reported)
+    if progress is not None:
+        progress(downloaded, total_size_in_bytes)
+    progress_bar.close()
+    return downloaded, hash_func.hexdigest() if hash_func is not None else None
+
+
+def get_file_hash(path: str, hash_mod: str) -> str:
+    """Get the hex digest of a file
+
+    Args:
+        path (str): The file
+        hash_mod (str): The hash algorithm, e.g. sha256
+
+    Returns:
+        str: The hex digest
+    """
+    hash_func = getattr(hashlib, hash_mod)()
+    buffer = bytearray(MAX_BLOCK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb') as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            hash_func.update(view[:size])
+    return hash_func.hexdigest()
+
+
+def download(url: str, dst: str, md5=None, sha1=None, sha256=None, sha512=None, progress=None, peers=None, log=print) -> None:
     """Download a file from a url and check the md5, sha1, sha256 and sha512 hashes if provided.
 
-    If the file already exists and the hashes match, it will not download it again.
+    If the file already exists and the hash matches, it will not even be requested again.
+    Without a hash an existing file is kept if its size matches the Content-Length.
     If multiple hashes are provided, only one of them must match.
     The prority of the hashes is: md5, sha1, sha256, sha512.
     The prority is the same as the order of the arguments.
     If the prorty is lower than the provided hash, it will not be checked.
     The lowest priority is md5.
     The highest priority is sha512.
+
+    If peers are given and a hash is provided, the file is requested as `<peer>/<hash>` from the
+    cache servers of the peers first (see `cache.CacheServer`), and from the url only if no peer
+    has a copy which matches the hash.
     
     Example:
     >>> download("https://example.com/file.zip", "file.zip", md5="d577273ff885c3f84dadb8578bb41399")
     >>> download("https://example.com/file.zip", "file.zip")
+    >>> download("https://example.com/file.zip", "file.zip", sha1="d2b41fbea1d890e7824fdbc50f47d1c44d8ebe7b", peers=["http://10.0.0.2:8190"])
 
     Args:
         url (str): The url to download the file from.
@@ -64,34 +240,70 @@ def download(url: str, dst: str, md5=None, sha1=None, sha256=None, sha512=None)
         sha1 (str, optional): The sha1 hash of the file.
         sha256 (str, optional): The sha256 hash of the file.
         sha512 (str, optional): The sha512 hash of the file.
+        progress (callable, optional): Called with (downloaded, total) bytes instead of showing a progress bar.
+        peers (list, optional): Base urls of peer cache servers.
+        log (callable, optional): Prints the messages about peers and existing files.
+
+    The file is written to a temporary file next to dst first and renamed when it is complete,
+    so other processes never see a partial download under the name dst.
 
     Raises:
-        Exception: If the file already exists and the hashes don't match.
+        Exception: If the download is incomplete or the hash doesn't match.
     """
     os.makedirs(os.path.split(dst)[0], exist_ok=True)
-    response = requests.get(url, stream=True)
-    total_size_in_bytes = int(response.headers.get('content-length', 0))
-    if os.path.exists(dst) and os.path.getsize(dst) == total_size_in_bytes:
-        print(f"{dst} already exists")
-        return
-    block_size = 1024
-    progress_bar = tqdm(total=total_size_in_bytes, unit='B', unit_scale=True)
 
     have_hash = md5 is not None or sha1 is not None or sha256 is not None or sha512 is not None
+    hash_mod = hash_value = None
     if have_hash:
         hash_mod = "sha512" if sha512 is not None else "sha256" if sha256 is not None else "sha1" if sha1 is not None else "md5" if md5 is not None else None
         hash_value = sha512 if sha512 is not None else sha256 if sha256 is not None else sha1 if sha1 is not None else md5 if md5 is not None else None
-        hash_func: hashlib.HASH = getattr(hashlib, hash_mod)()
 
-    with open(dst, 'wb') as file:
-        for data in response.iter_content(block_size):
-            progress_bar.update(len(data))
-            file.write(data)
-            if have_hash:
-                hash_func.update(data)
-    progress_bar.close()
-    if total_size_in_bytes != 0 and progress_bar.n != total_size_in_bytes and (not have_hash or hash_func.hexdigest() != hash_value):
-        raise Exception(f"Download of {url} failed")
+    # a cached file which matches the hash needs no request at all
+    if have_hash and os.path.exists(dst):
+        if get_file_hash(dst, hash_mod) == hash_value.lower():
+            log(f"{dst} already exists")
+            if progress is not None:
+                size = os.path.getsize(dst)
+                progress(size, size)
+            return
+        log(f"{dst} does not match its hash, downloading it again")
+
+    sources = [f"{i.rstrip('/')}/{hash_value}" for i in peers or []] if have_hash else []
+    sources.append(url)
+    part = f"{dst}.{os.getpid()}.part"
+    for source in sources:
+        is_peer = source is not url
+        response = None
+        try:
+            response = requests.get(source, stream=True, timeout=PEER_TIMEOUT if is_peer else None)
+            response.raise_for_status()
+
+            total_size_in_bytes = int(response.headers.get('content-length', 0))
+            # without a hash only the size can tell an existing file is complete
+            if not have_hash and os.path.exists(dst) and os.path.getsize(dst) == total_size_in_bytes:
+                log(f"{dst} already exists")
+                if progress is not None:
+                    progress(total_size_in_bytes, total_size_in_bytes)
+                return
+
+            downloaded, digest = receive(response, part, total_size_in_bytes, hash_mod, progress)
+            if (total_size_in_bytes != 0 and downloaded != total_size_in_bytes) or (have_hash and digest != hash_value.lower()):
+                if not is_peer:
+                    raise Exception(f"Download of {url} failed")
+                log(f"Peer {source} sent a corrupted file")
+                continue
+            os.replace(part, dst)
+            return
+        except TRANSFER_ERRORS as e:
+            # a peer which drops or stalls mid-body is skipped like one which does not answer
+            if not is_peer:
+                raise
+            log(f"Peer {source} unavailable ({type(e).__name__})")
+        finally:
+            if response is not None:
+                response.close()
+            if os.path.exists(part):
+                os.remove(part)
 
 
 def extract_zip(src: str, dst: str, rename: str = None) -> None:
@@ -116,7 +328,7 @@ def extract_zip(src: str, dst: str, rename: str = None) -> None:
         zip_ref.extractall(dst)
         dirname = zip_ref.namelist()[0]
     if rename is not None:
-        os.rename(os.path.join(dst, os.path.dirname(dirname)), os.path.join(dst, rename))
+        os.rename(os.path.join(dst, dirname.split("/")[0]), os.path.join(dst, rename))
 
 
 def extract_targz(src: str, dst: str, rename: str = None) -> None:
@@ -141,7 +353,7 @@ def extract_targz(src: str, dst: str, rename: str = None) -> None:
         tar_ref.extractall(dst)
         dirname = tar_ref.getnames()[0]
     if rename is not None:
-        os.rename(os.path.join(dst, os.path.dirname(dirname)), os.path.join(dst, rename))
+        os.rename(os.path.join(dst, dirname.split("/")[0]), os.path.join(dst, rename))
 
 def extract(src: str, dst: str, rename: str = None) -> None:
     """Extracts a file to the specified location.
@@ -174,6 +386,115 @@ def extract(src: str, dst: str, rename: str = None) -> None:
     else:
         raise Exception(f"Extraction of {src} not supported")
 
+def install_tree(dst: str, name: str, release: dict, build) -> None:
+    """Builds dst/name with build and writes its release.json, atomically.
+
+    The tree is built in a hidden staging directory in dst and renamed to dst/name
+    only after release.json has been written, so a scan of dst never sees a half
+    built tree. A leftover dst/name without release.json is replaced.
+
+    Example:
+    >>> install_tree("install", "jdk_17.0.1_ms", {"version": "17.0.1"}, lambda tree: os.makedirs(tree))
+
+    Args:
+        dst (str): Directory to install to
+        name (str): Name of the installed directory
+        release (dict): Content of release.json
+        build (callable): Called with the path the tree has to be created at
+    """
+    staging = os.path.join(dst, f".{name}.{os.getpid()}")
+    if os.path.exists(staging):
+        shutil.rmtree(staging)
+    try:
+        build(os.path.join(staging, name))
+        with open(os.path.join(staging, name, "release.json"), "w") as f:
+            json.dump(dict(release), f)
+        target = os.path.join(dst, name)
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        os.rename(os.path.join(staging, name), target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def install_archive(src: str, dst: str, name: str, release: dict) -> None:
+    """Extracts an archive to dst/name and writes its release.json and manifest.json, atomically.
+
+    See `install_tree`.
+
+    Example:
+    >>> install_archive("cache/file.zip", "install", "jdk_17.0.1_ms", {"version": "17.0.1"})
+
+    Args:
+        src (str): Source file
+        dst (str): Directory to install to
+        name (str): Name of the installed directory
+        release (dict): Content of release.json
+
+    Raises:
+        Exception: If the file is corrupted or not supported
+    """
+    def build(tree: str) -> None:
+        extract(src, os.path.dirname(tree), name)
+        write_manifest(tree)
+
+    install_tree(dst, name, release, build)
+
+
+def parse_version(version: str) -> tuple:
+    """Parse a version into a comparable tuple of its numbers
+
+    Example:
+    >>> parse_version("17.0.1")
+    (17, 0, 1)
+
+    Args:
+        version (str): The version
+
+    Returns:
+        tuple: The numbers in the version
+    """
+    return tuple(int(i) for i in re.findall(r"\d+", version))
+
+
+# pre-release qualifiers in the order of Maven's ComparableVersion, a release ranks above all of them
+PRE_RELEASES = {"alpha": 0, "ea": 0, "beta": 1, "milestone": 2, "m": 2, "rc": 3, "cr": 3, "snapshot": 4}
+RELEASE = len(PRE_RELEASES)
+PRE_RELEASE_PATTERN = re.compile(r"[-._]?(" + "|".join(PRE_RELEASES) + r")(?=[-._]?\d|[-._+]|$)", re.IGNORECASE)
+
+
+def version_key(version: str) -> tuple:
+    """Get a key which orders versions including their pre-release qualifiers
+
+    The numbers in front of a qualifier count as the version, a pre-release ranks
+    below the release of the same version, and the numbers after the qualifier
+    order the pre-releases. Trailing zeros are ignored, so 3.0 equals 3.0.0.
+
+    Example:
+    >>> sorted(["3.0.5", "3.0-alpha-7", "3.0", "3.0-beta-1"], key=version_key)
+    ['3.0-alpha-7', '3.0-beta-1', '3.0', '3.0.5']
+
+    Args:
+        version (str): The version
+
+    Returns:
+        tuple: The numbers of the release, the rank of the qualifier and the numbers after it
+    """
+    match = PRE_RELEASE_PATTERN.search(version)
+    release, rank, rest = version, RELEASE, ()
+    if match is not None:
+        release, rank, rest = version[:match.start()], PRE_RELEASES[match.group(1).lower()], parse_version(version[match.end():])
+    numbers = parse_version(release)
+    while numbers and numbers[-1] == 0:
+        numbers = numbers[:-1]
+    return numbers, rank, rest
+
+
+def is_prerelease(version: str) -> bool:
+    """Check if a version is an alpha, beta, milestone, release candidate, early access or snapshot"""
+    return PRE_RELEASE_PATTERN.search(version) is not None
+
+
 def get_avaliable_arches():
     """Get the avaliable arches
     
@@ -188,7 +509,7 @@ def get_avaliable_arches():
     """
     if platform.machine() == "i386":
         return {"x86", "i686", "i386", "i586", "i486"}
-    elif platform.machine() == "AMD64":
+    elif platform.machine() in ("AMD64", "x86_64"):
         return {"x86_64", "x86", "i386", "amd64"}
     elif platform.machine() == "aarch64":
         return {"aarch64", "armv7l", "armv6l", "armv8l", "armv8b", "armv8l", "armv8", "armv7", "armv6", "armv5", "armv4", "armv3", "armv2", "armv1", "arm"}
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from cache import CacheServer
+from utils import download
+
+ARCHIVE = "OpenJDK17U-jdk_x64_linux_hotspot_17.0.2_8.tar.gz"
+DATA = bytes(range(256)) * 4096
+HASH = hashlib.sha256(DATA).hexdigest()
+
+
+def start(httpd):
+    threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+    host, port = httpd.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def make_handler(body, drop_after=None):
+    """A plain HTTP server for any path, which closes the connection after drop_after bytes of the body"""
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:drop_after])
+            self.close_connection = True
+
+    return Handler
+
+
+@pytest.fixture
+def peer(tmp_path, monkeypatch):
+    """The cache server of another machine, which has the archive in its cache"""
+    root = tmp_path / "peer"
+    os.makedirs(root / "source")
+    os.makedirs(root / "cache")
+    with open(root / "source" / "jdk.json", "w") as f:
+        json.dump([{"url": f"https://example.com/{ARCHIVE}", "hash": HASH}], f)
+    (root / "cache" / ARCHIVE).write_bytes(DATA)
+    # the server works on the cache of its root, the downloads below only use absolute paths
+    monkeypatch.chdir(root)
+    server = CacheServer("127.0.0.1", 0)
+    url = start(server.httpd)
+    yield root, url
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+@pytest.fixture
+def http_server():
+    servers = []
+
+    def create(body, drop_after=None):
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(body, drop_after))
+        servers.append(httpd)
+        return start(httpd)
+
+    yield create
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_download_from_peer(tmp_path, peer):
+    _, peer_url = peer
+    dst = tmp_path / "local" / "cache" / ARCHIVE
+    messages = []
+    # the upstream url is never requested, nothing listens on it
+    download("http://127.0.0.1:9/archive", str(dst), sha256=HASH, peers=[peer_url], log=messages.append, progress=lambda *args: None)
+    assert dst.read_bytes() == DATA
+    assert messages == []
+
+
+def test_peer_dropping_mid_stream_is_skipped(tmp_path, peer, http_server):
+    _, peer_url = peer
+    dropping = http_server(DATA, drop_after=len(DATA) // 3)
+    dst = tmp_path / "local" / "cache" / ARCHIVE
+    messages = []
+    download("http://127.0.0.1:9/archive", str(dst), sha256=HASH, peers=[dropping, peer_url], log=messages.append, progress=lambda *args: None)
+    assert dst.read_bytes() == DATA
+    assert len(messages) == 1 and messages[0].startswith(f"Peer {dropping}/")
+    assert os.listdir(dst.parent) == [ARCHIVE]
+
+
+def test_corrupted_cache_is_not_served(tmp_path, peer, http_server):
+    root, peer_url = peer
+    (root / "cache" / ARCHIVE).write_bytes(DATA[::-1])
+    upstream = http_server(DATA)
+    dst = tmp_path / "local" / "cache" / ARCHIVE
+    messages = []
+    download(f"{upstream}/{ARCHIVE}", str(dst), sha256=HASH, peers=[peer_url], log=messages.append, progress=lambda *args: None)
+    assert dst.read_bytes() == DATA
+    assert messages == [f"Peer {peer_url}/{HASH} unavailable (HTTPError)"]
+
+
+def test_upstream_dropping_mid_stream_raises(tmp_path, http_server):
+    upstream = http_server(DATA, drop_after=len(DATA) // 3)
+    dst = tmp_path / "local" / "cache" / ARCHIVE
+    with pytest.raises(Exception):
+        download(f"{upstream}/{ARCHIVE}", str(dst), sha256=HASH, log=lambda *args: None, progress=lambda *args: None)
+    assert os.listdir(dst.parent) == []
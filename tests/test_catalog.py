@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from catalog import iter_json_array, load_catalog
+
+ENTRIES = [
+    {"distribution": "Microsoft", "version": "17.0.1", "url": "https://example.com/jdk-17.0.1.zip", "hash": "a" * 40},
+    {"version": "3.8.4", "url": "https://example.com/maven-3.8.4.zip", "sha512": "b" * 128, "size": 9046177},
+    {"text": "with \"escapes\", [brackets] and , commas", "numbers": [1.5e3, -2, 0.25, True, None]},
+    12345.678e-2,
+    "last",
+]
+
+
+def write(tmp_path, content):
+    path = tmp_path / "catalog.json"
+    path.write_text(content, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 65536])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_chunk_boundaries(tmp_path, chunk_size, indent):
+    path = write(tmp_path, json.dumps(ENTRIES, indent=indent))
+    assert list(iter_json_array(path, chunk_size)) == ENTRIES
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 64])
+@pytest.mark.parametrize("content, expected", [
+    ("[]", []),
+    (" \n[ ]\n ", []),
+    ("[1,2.5,-3e2]", [1, 2.5, -300.0]),
+    ("[ 1 , 2 ]\n", [1, 2]),
+])
+def test_valid(tmp_path, chunk_size, content, expected):
+    assert list(iter_json_array(write(tmp_path, content), chunk_size)) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 64])
+@pytest.mark.parametrize("content", [
+    "[1 2]",
+    "[1,,,2]",
+    "[,1]",
+    "[1,]",
+    "[1] garbage",
+    "[1][2]",
+    "[1, 2",
+    "[1,",
+    "",
+    "{}",
+    "[tru]",
+])
+def test_malformed(tmp_path, chunk_size, content):
+    with pytest.raises(ValueError):
+        list(iter_json_array(write(tmp_path, content), chunk_size))
+
+
+def test_load_catalog_filters(tmp_path):
+    path = write(tmp_path, json.dumps(ENTRIES[:2]))
+    sources = load_catalog(path, lambda i: "sha512" in i)
+    assert [dict(i) for i in sources] == [{"version": "3.8.4", "url": "https://example.com/maven-3.8.4.zip", "sha512": "b" * 128}]
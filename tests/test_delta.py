@@ -0,0 +1,170 @@
+import os
+import re
+import sys
+import json
+import zipfile
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from delta import delta_install, RangeError
+from maven import MavenManager
+from manifest import SKIPPED
+
+BASE_FILES = {
+    "bin/mvn": b"#!/bin/sh\n" * 10,
+    "lib/core.jar": os.urandom(300 * 1024),
+    "lib/plugin.jar": os.urandom(200 * 1024),
+    "conf/settings.xml": b"<settings/>\n",
+}
+# the core library changes and a library is added, the rest is reused
+TARGET_FILES = dict(BASE_FILES, **{"lib/core.jar": os.urandom(300 * 1024), "lib/added.jar": os.urandom(50 * 1024)})
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves the files of server.root with single byte ranges
+
+    server.ranges = False ignores the Range header, server.truncate = True closes ranged
+    bodies of more than one byte after half of them.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = os.path.join(self.server.root, self.path.strip("/"))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        match = re.match(r"bytes=(\d+)-(\d+)$", self.headers.get("Range", ""))
+        if match is None or not self.server.ranges:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        start, end = int(match.group(1)), min(int(match.group(2)), len(data) - 1)
+        body = data[start:end + 1]
+        self.send_response(206)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.end_headers()
+        if self.server.truncate and len(body) > 1:
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(tmp_path):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    httpd.root = str(tmp_path / "www")
+    httpd.ranges = True
+    httpd.truncate = False
+    os.makedirs(httpd.root)
+    threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+    host, port = httpd.server_address[:2]
+    httpd.url = f"http://{host}:{port}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_zip(path, top, files):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        for name, data in files.items():
+            zip_ref.writestr(f"{top}/{name}", data)
+
+
+def make_tree(path, files):
+    for name, data in files.items():
+        os.makedirs(os.path.dirname(os.path.join(path, name)), exist_ok=True)
+        with open(os.path.join(path, name), "wb") as f:
+            f.write(data)
+
+
+def read_tree(path):
+    """The files of a tree without the ones jdkmgr writes"""
+    files = {}
+    for dirpath, _, filenames in os.walk(path):
+        for i in filenames:
+            if dirpath == str(path) and i in SKIPPED:
+                continue
+            with open(os.path.join(dirpath, i), "rb") as f:
+                files[os.path.relpath(os.path.join(dirpath, i), path).replace(os.sep, "/")] = f.read()
+    return files
+
+
+def test_delta_reuses_unchanged_files(tmp_path, server):
+    make_zip(os.path.join(server.root, "target.zip"), "apache-maven-3.9.1", TARGET_FILES)
+    make_tree(tmp_path / "base", BASE_FILES)
+    stats = delta_install(f"{server.url}/target.zip", str(tmp_path / "base"), str(tmp_path / "dst"))
+    assert stats["reused"] == 3 and stats["downloaded"] == 2
+    assert stats["transferred"] < stats["size"] - len(BASE_FILES["lib/plugin.jar"])
+    assert read_tree(tmp_path / "dst") == TARGET_FILES
+
+
+def test_member_out_of_dst_is_rejected(tmp_path, server):
+    make_zip(os.path.join(server.root, "target.zip"), "apache-maven-3.9.1", {"../../evil": b"x", **TARGET_FILES})
+    make_tree(tmp_path / "base", BASE_FILES)
+    with pytest.raises(zipfile.BadZipFile):
+        delta_install(f"{server.url}/target.zip", str(tmp_path / "base"), str(tmp_path / "out" / "dst"))
+    assert not (tmp_path / "evil").exists()
+    assert not (tmp_path / "out" / "dst").exists()
+
+
+def test_server_without_ranges(tmp_path, server):
+    make_zip(os.path.join(server.root, "target.zip"), "apache-maven-3.9.1", TARGET_FILES)
+    server.ranges = False
+    with pytest.raises(RangeError):
+        delta_install(f"{server.url}/target.zip", str(tmp_path / "base"), str(tmp_path / "dst"))
+
+
+def test_truncated_range_raises_range_error(tmp_path, server):
+    make_zip(os.path.join(server.root, "target.zip"), "apache-maven-3.9.1", TARGET_FILES)
+    make_tree(tmp_path / "base", BASE_FILES)
+    server.truncate = True
+    with pytest.raises(RangeError):
+        delta_install(f"{server.url}/target.zip", str(tmp_path / "base"), str(tmp_path / "dst"))
+
+
+def make_maven_root(root, server):
+    """A root with maven 3.9.0 installed and 3.9.1 served as zip by server"""
+    make_zip(os.path.join(server.root, "apache-maven-3.9.1-bin.zip"), "apache-maven-3.9.1", TARGET_FILES)
+    with open(os.path.join(server.root, "apache-maven-3.9.1-bin.zip"), "rb") as f:
+        sha1 = hashlib.sha1(f.read()).hexdigest()
+    sources = [
+        {"url": f"{server.url}/apache-maven-3.9.0-bin.zip", "sha1": "0" * 40, "version": "3.9.0"},
+        {"url": f"{server.url}/apache-maven-3.9.1-bin.zip", "sha1": sha1, "version": "3.9.1"},
+    ]
+    os.makedirs(os.path.join(root, "source"))
+    with open(os.path.join(root, "source", "maven.json"), "w") as f:
+        json.dump(sources, f)
+    make_tree(os.path.join(root, "install", "maven_3.9.0"), BASE_FILES)
+    with open(os.path.join(root, "install", "maven_3.9.0", "release.json"), "w") as f:
+        json.dump(sources[0], f)
+    return MavenManager(None, root=str(root), log=lambda *args, **kargs: None)
+
+
+def test_upgrade_builds_an_unverified_tree(tmp_path, server):
+    manager = make_maven_root(tmp_path / "root", server)
+    assert manager.upgrade("maven_3.9.1")
+    assert manager.indstalled["maven_3.9.1"]["verified"] is False
+    assert read_tree(tmp_path / "root" / "install" / "maven_3.9.1") == TARGET_FILES
+    # the reused files are links to the base
+    assert os.path.samefile(tmp_path / "root" / "install" / "maven_3.9.0" / "lib" / "plugin.jar",
+                            tmp_path / "root" / "install" / "maven_3.9.1" / "lib" / "plugin.jar")
+
+
+def test_upgrade_falls_back_to_the_full_archive(tmp_path, server):
+    manager = make_maven_root(tmp_path / "root", server)
+    server.truncate = True
+    assert manager.upgrade("maven_3.9.1")
+    assert manager.indstalled["maven_3.9.1"].get("verified", True)
+    assert read_tree(tmp_path / "root" / "install" / "maven_3.9.1") == TARGET_FILES
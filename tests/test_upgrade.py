@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from maven import MavenManager
+from utils import version_key, is_prerelease
+
+
+def make_root(root, versions, installed):
+    os.makedirs(os.path.join(root, "source"))
+    sources = [{"url": f"https://archive.apache.org/dist/maven/apache-maven-{i}-bin.zip", "sha1": f"{n:040x}", "version": i}
+               for n, i in enumerate(versions)]
+    with open(os.path.join(root, "source", "maven.json"), "w") as f:
+        json.dump(sources, f)
+    for source in sources:
+        if source["version"] in installed:
+            tree = os.path.join(root, "install", f"maven_{source['version']}")
+            os.makedirs(os.path.join(tree, "bin"))
+            open(os.path.join(tree, "bin", "mvn"), "w").close()
+            with open(os.path.join(tree, "release.json"), "w") as f:
+                json.dump(source, f)
+    return MavenManager(None, root=str(root), log=lambda *args, **kargs: None)
+
+
+def test_version_key_orders_qualifiers():
+    versions = ["3.0.5", "3.0-alpha-7", "3.0", "3.0-beta-1", "2.1.0", "2.1.0-M1", "3.9.0-rc-2", "3.9.0"]
+    assert sorted(versions, key=version_key) == ["2.1.0-M1", "2.1.0", "3.0-alpha-7", "3.0-beta-1", "3.0", "3.0.5", "3.9.0-rc-2", "3.9.0"]
+    assert version_key("3.0") == version_key("3.0.0")
+    assert is_prerelease("2.1.0-M1") and is_prerelease("21-ea+3") and not is_prerelease("8u312b07")
+
+
+def test_pre_releases_are_no_upgrades(tmp_path):
+    manager = make_root(tmp_path, ["3.0.5", "3.0-alpha-7", "2.1.0", "2.1.0-M1"], ["3.0.5", "2.1.0"])
+    assert manager.get_upgrades() == {}
+
+
+def test_newest_release_is_the_upgrade(tmp_path):
+    manager = make_root(tmp_path, ["3.0.4", "3.0.5", "3.0.6-rc-1", "3.0-alpha-7"], ["3.0.4"])
+    assert manager.get_upgrades() == {"maven_3.0.4": "maven_3.0.5"}
+
+
+def test_unverified_trees_are_shown(tmp_path, monkeypatch):
+    manager = make_root(tmp_path, ["3.0.4", "3.0.5"], ["3.0.4", "3.0.5"])
+    # a tree built by a delta upgrade
+    release = dict(manager.indstalled["maven_3.0.5"], verified=False)
+    with open(tmp_path / "install" / "maven_3.0.5" / "release.json", "w") as f:
+        json.dump(release, f)
+    manager.scan_installed()
+    output = []
+    manager.log = lambda *args, **kargs: output.append(" ".join(map(str, args)) + kargs.get("end", "\n"))
+    manager.list()
+    assert "  maven_3.0.4\n" in "".join(output) and "  maven_3.0.5 unverified\n" in "".join(output)
+
+    monkeypatch.chdir(tmp_path)
+    output.clear()
+    assert manager.use("maven_3.0.5")
+    assert output[-1].startswith("Warning: maven_3.0.5 was built by a delta upgrade")
@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from jdk import JDKManager
+from maven import MavenManager
+from bundle import BundleManager
+from lockfile import LockfileManager
+
+
+def make_root(root):
+    os.makedirs(os.path.join(root, "source"))
+    source = {"url": "https://archive.apache.org/dist/maven/apache-maven-3.9.0-bin.zip", "sha1": "0" * 40, "version": "3.9.0"}
+    with open(os.path.join(root, "source", "maven.json"), "w") as f:
+        json.dump([source], f)
+    tree = os.path.join(root, "install", "maven_3.9.0")
+    os.makedirs(os.path.join(tree, "bin"))
+    open(os.path.join(tree, "bin", "mvn"), "w").close()
+    with open(os.path.join(tree, "release.json"), "w") as f:
+        json.dump(source, f)
+
+
+def test_project_is_relative_to_working_dir(tmp_path, monkeypatch):
+    root, caller = tmp_path / "root", tmp_path / "caller"
+    make_root(str(root))
+    os.makedirs(caller / "proj")
+    # the CLI runs in the root, the project is given relative to the dir it was started from
+    monkeypatch.chdir(root)
+    manager = MavenManager(None, root=str(root), log=lambda *args, **kargs: None, working_dir=str(caller))
+    assert manager.apply_profile("parallel", "maven_3.9.0", "proj")
+    assert (caller / "proj" / ".mvn" / "maven.config").read_text() == "-T1C\n"
+    assert not (root / "proj").exists()
+
+
+def make_managers(root):
+    with open(os.path.join(root, "source", "jdk.json"), "w") as f:
+        json.dump([], f)
+    jdk = JDKManager(None, root=str(root), log=lambda *args, **kargs: None)
+    maven = MavenManager(None, root=str(root), log=lambda *args, **kargs: None)
+    return jdk, maven
+
+
+def test_bundle_is_relative_to_working_dir(tmp_path, monkeypatch):
+    root, caller = tmp_path / "root", tmp_path / "caller"
+    make_root(str(root))
+    os.makedirs(caller)
+    monkeypatch.chdir(root)
+    bundle = BundleManager(argparse.ArgumentParser().add_subparsers(), *make_managers(root), working_dir=str(caller))
+    assert bundle.export(["maven_3.9.0"], "maven.tgz")
+    assert (caller / "maven.tgz").exists()
+    assert not (root / "maven.tgz").exists()
+
+
+def test_lockfile_is_relative_to_working_dir(tmp_path, monkeypatch):
+    root, caller = tmp_path / "root", tmp_path / "caller"
+    make_root(str(root))
+    os.makedirs(caller)
+    monkeypatch.chdir(root)
+    lockfile = LockfileManager(argparse.ArgumentParser().add_subparsers(), *make_managers(root), working_dir=str(caller))
+    assert lockfile.lock()
+    with open(caller / "jdkmgr.lock") as f:
+        assert "maven_3.9.0" in json.load(f)["maven"]["installed"]
+    assert not (root / "jdkmgr.lock").exists()